@@ -0,0 +1,255 @@
+#!/usr/bin/python3
+"""timings for cron_tz_conv stages.
+    python3 bench_cron_tz_conv.py [--json results.json]
+results written as json can be compared between releases
+"""
+import argparse
+import collections
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import time
+import sys
+
+import cron_tz_conv
+
+SERVER_TZ = 'Asia/Calcutta'
+JOB_TZ = 'Europe/London'
+DEFAULTS = None
+DEDUP_ENTRY = '* * * * 1-7 root command -v debian-sa1 > /dev/null && debian-sa1 1 1'
+SQUEEZE_ENTRIES = [
+    '* 20 * * 1-7 root command -v debian-sa1 > /dev/null && debian-sa1 1 1',
+    '* 20 30,31 3 1-7 root command -v debian-sa1 > /dev/null && debian-sa1 1 1',
+    '* 20 30/2 10 * root command -v debian-sa1 > /dev/null && debian-sa1 1 1',
+    '30 10 16-20 12 mon,sun root command -v debian-sa1 > /dev/null && debian-sa1 1 1',
+    '* * * * 1-7 root command -v debian-sa1 > /dev/null && debian-sa1 1 1',
+]
+
+NEXT_FIRE_ENTRIES = [
+    '*/15 9-17 * * 1-5 root run-report',
+    '30 1 * * * root backup',
+    '0 0 29 2 * root leap-day',
+]
+NEXT_FIRE_START = datetime.datetime(2026,10,20,tzinfo=datetime.timezone.utc)
+""" (entry,serverTz,jobTz,now) timed stage by stage. every minute, a
+fractional offset pair, dst changing in the month, and one without dst"""
+STAGE_CASES = [
+    ('* * * * * root every-minute','Asia/Calcutta','Europe/London',datetime.datetime(2026,10,1)),
+    ('* 20 * * 1 root dst-month','Asia/Calcutta','Europe/London',datetime.datetime(2026,3,1)),
+    ('*/5 * * * * root dst-both','America/New_York','Europe/London',datetime.datetime(2026,3,1)),
+    ('30 5 * * 1-5 root no-dst','Asia/Calcutta','Asia/Tokyo',datetime.datetime(2026,7,1)),
+]
+""" zone pairs timed for every tz backend, with and without dst, one with
+negative dst and a fractional one """
+TZ_BACKEND_PAIRS = [
+    ('Asia/Calcutta','Europe/London'),
+    ('America/New_York','Europe/Dublin'),
+    ('Australia/Lord_Howe','America/Santiago'),
+    ('Asia/Tokyo','Asia/Kolkata'),
+]
+TZ_BACKEND_YEARS = range(2026,2031)
+TZ_BACKEND_STEP = datetime.timedelta(minutes=97) ## per minute conversions, about 5400 a year
+MAIN_FILES = [os.path.join(os.path.dirname(os.path.abspath(__file__)),'cron.file')]
+RESULTS = []
+
+def Record(group,name,secs,**info):
+    """a timing for --json"""
+    RESULTS.append(dict(group=group,name=name,secs=secs,**info))
+
+def GetUniqueEntriesQuadratic(entries):
+    """GetUniqueEntries() as it was, searches rest of the list for every entry"""
+    uniqueEntries = []
+    for idx,rec in enumerate(entries):
+        if rec not in entries[idx+1:]:
+            uniqueEntries.append(rec)
+
+    return uniqueEntries
+
+def TimeIt(func,*args,repeat=3):
+    """best of repeat runs, in secs"""
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        took = time.perf_counter() - start
+        if best is None or took < best:
+            best = took
+
+    return best
+
+def SetUp():
+    global DEFAULTS
+    DEFAULTS = cron_tz_conv.GetDefaultValues()
+
+def GetRecord(line):
+    return cron_tz_conv.GetLineAsRecord(line)
+
+def GetAdjustedEntries(line,serverTz=SERVER_TZ,jobTz=JOB_TZ):
+    return sorted(cron_tz_conv.AdjustForTz(GetRecord(line),serverTz,jobTz,DEFAULTS),key=cron_tz_conv.SORT_KEY)
+
+def SqueezeIteratively(record):
+    return cron_tz_conv.SqueezeEntriesIteratively(cron_tz_conv.AdjustForTz(record,SERVER_TZ,JOB_TZ,DEFAULTS))
+
+def Compact(record):
+    return cron_tz_conv.CompactEntries(cron_tz_conv.MergeRuns(cron_tz_conv.AdjustForTzAsBlocks(record,SERVER_TZ,JOB_TZ,DEFAULTS)))
+
+def BenchDedup(legacyLimit,repeat):
+    entries = GetAdjustedEntries(DEDUP_ENTRY)
+    head = entries[:legacyLimit]
+
+    print("dedup, {0} -> {1}, {2} entries".format(JOB_TZ,SERVER_TZ,len(entries)))
+    for (name,func,inp,rep) in (
+            ('GetUniqueEntries',cron_tz_conv.GetUniqueEntries,entries,repeat),
+            ('GetUniqueEntries',cron_tz_conv.GetUniqueEntries,head,repeat),
+            ('GetUniqueEntriesQuadratic',GetUniqueEntriesQuadratic,head,1)):
+        took = TimeIt(func,inp,repeat=rep)
+        Record('dedup',name,took,entries=len(inp))
+        print("  {0:28}{1:10.4f}s {2} entries".format(name,took,len(inp)))
+
+def BenchSqueeze(repeat):
+    print("squeeze, {0} -> {1}, AdjustForTz+SqueezeEntriesIteratively vs AdjustForTzAsBlocks+MergeRuns+CompactEntries".format(JOB_TZ,SERVER_TZ))
+    for line in SQUEEZE_ENTRIES:
+        record = GetRecord(line)
+        print("  {0}".format(' '.join(line.split()[:5])))
+        for (name,func) in (('SqueezeEntriesIteratively',SqueezeIteratively),('CompactEntries',Compact)):
+            took = TimeIt(func,record,repeat=repeat)
+            Record('squeeze',name,took,entry=' '.join(line.split()[:5]),lines=len(func(record)))
+            print("    {0:26}{1:10.4f}s {2} lines".format(name,took,len(func(record))))
+
+def BenchNextFireTimes(queries,count):
+    print("next {0} fire times, {1} -> {2}, {3} queries".format(count,JOB_TZ,SERVER_TZ,queries))
+    for line in NEXT_FIRE_ENTRIES:
+        record = GetRecord(line)
+        took = TimeIt(lambda: [cron_tz_conv.GetNextFireTimes(record,JOB_TZ,NEXT_FIRE_START,count,SERVER_TZ) for i in range(queries)])
+        Record('next_fire_times','GetNextFireTimes',took/queries,entry=' '.join(line.split()[:5]),count=count)
+        print("  {0:28}{1:10.0f} queries/s".format(' '.join(line.split()[:5]),queries/took))
+
+def GetLegacyStageInputs(record,serverTz,jobTz,defaults):
+    """ inputs of the stages SqueezeEntriesIteratively() runs, as it makes
+    them: sorted adjusted entries, those made unique, and the entries the
+    last squeeze, SqueezeOnFieldForTzShiftWithMins(), gets"""
+    adjusted = sorted(cron_tz_conv.AdjustForTz(record,serverTz,jobTz,defaults),key=cron_tz_conv.SORT_KEY)
+    unique = cron_tz_conv.GetUniqueEntries(adjusted)
+
+    entries = list(adjusted)
+    for x in ([1,2]):
+        for k in cron_tz_conv.SQUEEZE_ORDER:
+            entries.sort(key=cron_tz_conv.SORT_KEY)
+            entries = cron_tz_conv.SqueezeOnField(cron_tz_conv.GetUniqueEntries(entries),cron_tz_conv.SQUEEZE_FILED_OBJS[k])
+    entries.sort(key=cron_tz_conv.SORT_KEY)
+
+    return (adjusted,unique,cron_tz_conv.GetUniqueEntries(entries))
+
+def BenchStages(repeat):
+    print("stages of STAGE_CASES")
+    sqzFieldObjs = [cron_tz_conv.SQUEEZE_FILED_OBJS['dom'],cron_tz_conv.SQUEEZE_FILED_OBJS['dow']]
+    for (line,serverTz,jobTz,now) in STAGE_CASES:
+        record = GetRecord(line)
+        defaults = cron_tz_conv.GetDefaultValues(now)
+        (adjusted,unique,lastSqueezed) = GetLegacyStageInputs(record,serverTz,jobTz,defaults)
+        case = "{0}, {1} -> {2}, {3:%Y-%m}".format(' '.join(line.split()[:5]),jobTz,serverTz,now)
+        print("  {0}".format(case))
+
+        stages = collections.OrderedDict((
+            ('GetMatchingDays',lambda: sum(1 for day in cron_tz_conv.GetMatchingDays(cron_tz_conv.EntryMasks(record,defaults),defaults.year))),
+            ('GetEntryAsTimeStamps',lambda: sum(1 for ts in cron_tz_conv.GetEntryAsTimeStamps(record,jobTz,defaults))),
+            ('AdjustForTz',lambda: list(cron_tz_conv.AdjustForTz(record,serverTz,jobTz,defaults))),
+            ('GetUniqueEntries',lambda: cron_tz_conv.GetUniqueEntries(adjusted)),
+            ('SqueezeOnField',lambda: cron_tz_conv.SqueezeOnField(unique,cron_tz_conv.SQUEEZE_FILED_OBJS['minute'])),
+            ('SqueezeOnFieldForTzShiftWithMins',lambda: cron_tz_conv.SqueezeOnFieldForTzShiftWithMins(lastSqueezed,sqzFieldObjs)),
+            ('GetEntryTimes',lambda: cron_tz_conv.GetEntryTimes(record,serverTz,jobTz,defaults)),
+        ))
+        for (name,func) in stages.items():
+            took = TimeIt(func,repeat=repeat)
+            Record('stages',name,took,case=case,adjusted=len(adjusted))
+            print("    {0:34}{1:10.4f}s".format(name,took))
+
+def BenchAdjustEngines(repeat):
+    print("adjust engines, AdjustForTzAsBlocks vs AdjustForTzVectorized, STAGE_CASES and every minute of a year")
+    if importlib.util.find_spec('numpy') == None:
+        print("  numpy not installed")
+        return
+
+    cases = STAGE_CASES + [('* * * 1-12 * root every-minute-year','Asia/Calcutta','Europe/London',datetime.datetime(2026,1,1))]
+    for (line,serverTz,jobTz,now) in cases:
+        record = GetRecord(line)
+        defaults = cron_tz_conv.GetDefaultValues(now)
+        case = "{0}, {1} -> {2}, {3:%Y-%m}".format(' '.join(line.split()[:5]),jobTz,serverTz,now)
+        print("  {0}".format(case))
+        for name in cron_tz_conv.ADJUST_ENGINES:
+            adjustFunc = cron_tz_conv.GetAdjustFunc(name)
+            took = TimeIt(lambda: list(adjustFunc(record,serverTz,jobTz,defaults)),repeat=repeat)
+            Record('adjust_engines','adjust',took,case=case,engine=name)
+            print("    {0:28}{1:10.4f}s".format(name,took))
+
+def ClearZoneCaches():
+    cron_tz_conv.GetOffsetTable.cache_clear()
+    cron_tz_conv.GetZoneTable.cache_clear()
+    cron_tz_conv.GetZoneYearTransitions.cache_clear()
+
+def BuildOffsetTables(backend):
+    ClearZoneCaches()
+    for (serverTz,jobTz) in TZ_BACKEND_PAIRS:
+        for year in TZ_BACKEND_YEARS:
+            cron_tz_conv.GetOffsetTable(serverTz,jobTz,year,backend)
+
+def ConvertEveryStep(backend):
+    for (serverTz,jobTz) in TZ_BACKEND_PAIRS:
+        ts = datetime.datetime(TZ_BACKEND_YEARS[0],1,1)
+        while ts.year == TZ_BACKEND_YEARS[0]:
+            cron_tz_conv.ConvertJobTsToServerTs(ts,jobTz,serverTz,backend)
+            ts += TZ_BACKEND_STEP
+
+def BenchTzBackends(repeat):
+    print("tz backends, {0} zone pairs".format(len(TZ_BACKEND_PAIRS)))
+    cases = collections.OrderedDict((
+        ('GetOffsetTable',lambda name: BuildOffsetTables(cron_tz_conv.GetTzBackend(name))),
+        ('ConvertJobTsToServerTs',lambda name: ConvertEveryStep(cron_tz_conv.GetTzBackend(name))),
+        ('Main',lambda name: [cron_tz_conv.Main(inFile,os.devnull,tzBackend=name) for inFile in MAIN_FILES]),
+    ))
+    try:
+        for name in sorted(cron_tz_conv.TZ_BACKENDS):
+            print("  {0}".format(name))
+            for (case,func) in cases.items():
+                took = TimeIt(lambda: func(name),repeat=repeat)
+                Record('tz_backends',case,took,backend=name)
+                print("    {0:28}{1:10.4f}s".format(case,took))
+    finally:
+        ClearZoneCaches()
+
+def BenchMain(repeat):
+    print("Main, full runs")
+    for inFile in MAIN_FILES:
+        took = TimeIt(cron_tz_conv.Main,inFile,os.devnull,repeat=repeat)
+        Record('main','Main',took,file=os.path.basename(inFile))
+        print("  {0:28}{1:10.4f}s".format(os.path.basename(inFile),took))
+
+def WriteResults(resultsFile):
+    with open(resultsFile,'w') as resultsHandle:
+        json.dump({
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'results': RESULTS,
+        },resultsHandle,indent=1)
+
+if __name__ == '__main__':
+    argParser = argparse.ArgumentParser()
+    argParser.add_argument('-r','--repeat',type=int,default=3)
+    argParser.add_argument('--legacy-limit',type=int,default=5000,
+        help='quadratic dedup is run only on these many entries')
+    argParser.add_argument('--queries',type=int,default=2000,help='GetNextFireTimes() calls timed per entry')
+    argParser.add_argument('--json',type=str,metavar='FILE',help='write results to FILE as json too')
+
+    parsedArgs = vars(argParser.parse_args())
+    SetUp()
+    BenchDedup(parsedArgs['legacy_limit'],parsedArgs['repeat'])
+    BenchSqueeze(parsedArgs['repeat'])
+    BenchNextFireTimes(parsedArgs['queries'],10)
+    BenchStages(parsedArgs['repeat'])
+    BenchAdjustEngines(parsedArgs['repeat'])
+    BenchMain(parsedArgs['repeat'])
+    BenchTzBackends(parsedArgs['repeat'])
+    if parsedArgs['json'] != None:
+        WriteResults(parsedArgs['json'])
@@ -1,14 +1,30 @@
 #!/usr/bin/python3
-import re
-import pytz
+import abc
+import argparse
+import bisect
 import calendar
+import collections
+import datetime
+import functools
+import importlib.util
 import operator
-import argparse
+import heapq
+import itertools
+import io
+import os
+import re
 import sys
+import threading
+import time
+import zlib
 
 class InvalidCronEntryError(Exception):
     pass
 
+class OutputMismatchError(Exception):
+    """converted output given to VerifyCrontab() is not of its input"""
+    pass
+
 class SqueezeFieldObject():
     def __init__(self,field,minimum,maximum):
         self.sqzField = field
@@ -30,15 +46,701 @@ class CronEntry():
     def __str__(self):
         return "domHit {self.domHit} dowHit {self.dowHit} ts {self.ts} adjustedTs {self.adjustedTs}".format(self=self)
 
+class ServerEntry(collections.namedtuple('ServerEntry',['minute','hour','dom','month','dow','command','sortKey'])):
+    """ tz adjusted cron entry. one is created for every fired minute, so it is
+    kept small. time fields are bitmasks, see MaskFromValues(), turned into
+    text only when printed. command is the record's string, shared by all
+    entries of the record.
+    sortKey is worked out once here, see GenerateSortKey(), and again only
+    when _replace() changes a field"""
+    __slots__ = ()
+
+    def __new__(cls,minute,hour,dom,month,dow,command):
+        sortKey = GenerateSortKey(minute,hour,dom,month,dow)
+        return super().__new__(cls,minute,hour,dom,month,dow,command,sortKey)
+
+    def _replace(self,**fields):
+        values = dict(zip(self._fields[:-1],self[:-1]))
+        values.update(fields)
+        return ServerEntry(**values)
+
+class OffsetTable():
+    """ offset of server tz to job tz over a year of job tz wall clock.
+    segments are (segStart,segEnd,delta), see GetOffsetSegments()"""
+    def __init__(self,segments):
+        self.segments = tuple(segments)
+        self.starts = [seg[0] for seg in self.segments]
+
+    def GetSegmentIndex(self,ts):
+        return bisect.bisect_right(self.starts,ts)-1
+
+    def GetDelta(self,ts):
+        """server time - job time for job tz wall clock ts"""
+        return self.segments[self.GetSegmentIndex(ts)][2]
+
+class TzBackend(abc.ABC):
+    """ zone lookups the conversion is built on, by zone name. a backend
+    gives the wall clock of a utc time, GetLocalTs(), both readings of a
+    wall clock time, GetUtcTimes(), and the offset changes over a span of
+    utc, GetTransitions(), abstract, so a backend missing one fails when
+    built. the rest is in terms of these.
+    a backend keeps nothing but the modules it imports, so backends of a
+    kind are equal, tables cached with one are found with another, and
+    one is sent to a process pool by name, see GetTzBackend()"""
+    name = None
+
+    def __eq__(self,other):
+        return type(self) == type(other)
+
+    def __hash__(self):
+        return hash(type(self))
+
+    def __reduce__(self):
+        return (GetTzBackend,(self.name,))
+
+    @property
+    def version(self):
+        """ version of the tz data zones come from, GetTzDataVersion(). a part
+        of cache keys, so output converted with older data is not taken for current"""
+        return GetTzDataVersion(self.name)
+
+    @abc.abstractmethod
+    def GetZone(self,tzName):
+        """tzinfo of tzName, KeyError when the zone is not known"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def GetLocalTs(self,utcTs,tzName):
+        """naive utc to naive tzName wall clock"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def GetUtcTimes(self,ts,tzName):
+        """ (fold 0,fold 1) naive utc of naive tzName wall clock ts, as in
+        PEP 495. the same time twice but in a dst gap or overlap. in an
+        overlap fold 0 is the first pass, in a gap fold 0 keeps the offset
+        from before it, so lands after the gap"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def GetTransitions(self,tzName,start,end):
+        """ yield (utcTs,offsetBefore,offsetAfter) for offset changes of
+        tzName between start and end, naive utc datetimes"""
+        raise NotImplementedError
+
+    def GetUtcTs(self,ts,tzName):
+        """ naive utc of naive tzName wall clock ts. a time in a dst gap is
+        read with fold DST_GAP_FOLD, one in an overlap with DST_OVERLAP_FOLD"""
+        (utcTs,otherUtcTs) = self.GetUtcTimes(ts,tzName)
+        if utcTs < otherUtcTs:
+            return (utcTs,otherUtcTs)[DST_OVERLAP_FOLD]
+        elif utcTs > otherUtcTs:
+            return (utcTs,otherUtcTs)[DST_GAP_FOLD]
+        else:
+            return utcTs
+
+    def GetOffsets(self,tzName,start,end):
+        """all utc offsets tzName uses between start and end, naive utc"""
+        offsets = {self.GetLocalTs(start,tzName) - start}
+        for (utcTs,before,after) in self.GetTransitions(tzName,start,end):
+            offsets.add(after)
 
-DEFAULT_VALUES = {
-    'minute' : '',
-    'hour' : '',
-    'dom' : '',
-    'month' : '',
-    'dow' : '',
-    'year' : '',
-}
+        return offsets
+
+class PytzBackend(TzBackend):
+    """zones of pytz, with the olson data it ships"""
+    name = 'pytz'
+
+    def __init__(self):
+        import pytz
+        self.pytz = pytz
+
+    def GetZone(self,tzName):
+        return self.pytz.timezone(tzName)
+
+    def GetLocalTs(self,utcTs,tzName):
+        pytz = self.pytz
+        return pytz.utc.localize(utcTs).astimezone(self.GetZone(tzName)).replace(tzinfo=None)
+
+    def GetUtcTimes(self,ts,tzName):
+        """ pytz has no fold, is_dst=None tells a plain time from an ambiguous
+        or nonexistent one, then both is_dst readings are sorted into folds"""
+        pytz = self.pytz
+        tzObj = self.GetZone(tzName)
+        try:
+            utcTs = tzObj.localize(ts,is_dst=None).astimezone(pytz.utc).replace(tzinfo=None)
+            return (utcTs,utcTs)
+        except pytz.AmbiguousTimeError:
+            isGap = False
+        except pytz.NonExistentTimeError:
+            isGap = True
+
+        utcTimes = sorted(tzObj.localize(ts,is_dst=isDst).astimezone(pytz.utc).replace(tzinfo=None) for isDst in (False,True))
+        return tuple(reversed(utcTimes)) if isGap else tuple(utcTimes)
+
+    def GetTransitions(self,tzName,start,end):
+        """ from the zone's own table, static zones have none. the table is
+        pytz internals, _utc_transition_times and _transition_info of its
+        DstTzInfo zones. a zone without them is scanned, ScanTransitions()"""
+        tzObj = self.GetZone(tzName)
+        if tzObj.utcoffset(None) != None:
+            return ## fixed offset, tzinfo gives it without a datetime
+
+        if not (hasattr(tzObj,'_utc_transition_times') and hasattr(tzObj,'_transition_info')):
+            yield from ScanTransitions(lambda utcTs: self.GetLocalTs(utcTs,tzName) - utcTs,start,end)
+            return
+
+        transitionTimes = tzObj._utc_transition_times
+        transitionInfo = tzObj._transition_info
+        idx = bisect.bisect_left(transitionTimes,start)
+        while 0 < idx < len(transitionTimes) and transitionTimes[idx] <= end:
+            yield (transitionTimes[idx],transitionInfo[idx-1][0],transitionInfo[idx][0])
+            idx+=1
+
+class ZoneInfoBackend(TzBackend):
+    """ zones of the standard library zoneinfo, from the system tz database
+    or the tzdata package. zoneinfo does not list its transitions, they
+    are found by GetZoneYearTransitions()"""
+    name = 'zoneinfo'
+
+    def __init__(self):
+        import zoneinfo
+        self.zoneinfo = zoneinfo
+
+    def GetZone(self,tzName):
+        return self.zoneinfo.ZoneInfo(tzName)
+
+    def GetLocalTs(self,utcTs,tzName):
+        zone = self.GetZone(tzName)
+        return zone.fromutc(utcTs.replace(tzinfo=zone)).replace(tzinfo=None)
+
+    def GetUtcTimes(self,ts,tzName):
+        zone = self.GetZone(tzName)
+        return (ts - zone.utcoffset(ts),ts - zone.utcoffset(ts.replace(fold=1)))
+
+    def GetTransitions(self,tzName,start,end):
+        for year in range(start.year-1,end.year+2):
+            for (utcTs,before,after) in GetZoneYearTransitions(tzName,year):
+                if start <= utcTs <= end:
+                    yield (utcTs,before,after)
+
+class TransitionTableBackend(ZoneInfoBackend):
+    """ zones of zoneinfo, looked up in transition tables built once per
+    zone and year, see GetZoneTable(). no tzinfo is used past the building"""
+    name = 'table'
+
+    def GetLocalTs(self,utcTs,tzName):
+        return GetZoneTable(tzName,utcTs.year).GetLocalTs(utcTs)
+
+    def GetUtcTimes(self,ts,tzName):
+        return GetZoneTable(tzName,ts.year).GetUtcTimes(ts)
+
+class ZoneTable():
+    """ offset changes of a zone from a year before to a year after a year,
+    as sorted lists to bisect. offsets[i] is the offset in use before
+    utcTimes[i], and after the one before it. a transition moves the wall
+    clock over wallStarts[i]..wallEnds[i], the gap or overlap it makes"""
+    def __init__(self,transitions,firstOffset):
+        self.utcTimes = [utcTs for (utcTs,before,after) in transitions]
+        self.offsets = [firstOffset] + [after for (utcTs,before,after) in transitions]
+        self.wallStarts = [utcTs + min(before,after) for (utcTs,before,after) in transitions]
+        self.wallEnds = [utcTs + max(before,after) for (utcTs,before,after) in transitions]
+
+    def GetLocalTs(self,utcTs):
+        return utcTs + self.offsets[bisect.bisect_right(self.utcTimes,utcTs)]
+
+    def GetUtcTimes(self,ts):
+        """see TzBackend.GetUtcTimes()"""
+        idx = bisect.bisect_right(self.wallStarts,ts)
+        if idx > 0 and ts < self.wallEnds[idx-1]:
+            (before,after) = (self.offsets[idx-1],self.offsets[idx])
+            return (ts - before,ts - after)
+
+        return (ts - self.offsets[idx],ts - self.offsets[idx])
+
+class CalendarIndex():
+    """ days of the months of a year as dom style bitmasks, bit n for day n.
+    monthDays[month] are the days of month, firstWeekDays[month] the iso
+    week day of its 1st. a (month,dom) maps to its week day with a modulo,
+    and a dow mask to the days it hits by rotating it to the 1st and
+    repeating it for every week, see GetHitDays()"""
+    def __init__(self,year):
+        self.year = year
+        self.monthDays = [0]*13
+        self.firstWeekDays = [0]*13
+        for month in range(1,12+1):
+            first = datetime.date(year,month,1)
+            nextFirst = datetime.date(year+month//12,month%12+1,1)
+            self.monthDays[month] = ((1 << (nextFirst - first).days)-1) << 1
+            self.firstWeekDays[month] = first.isoweekday()
+
+    def GetMonthLength(self,month):
+        return self.monthDays[month].bit_length()-1
+
+    def GetWeekDay(self,month,dom):
+        """iso week day of dom of month"""
+        return (self.firstWeekDays[month]-1 + dom-1) % 7 + 1
+
+    def GetHitDays(self,month,domMask,dowMask):
+        """ (domDays,dowDays) days of month hit by a dom mask and by a dow
+        mask of iso week days. bit d-1 of the rotated week is the week day
+        of day d, 7 apart from the rest of its week days"""
+        week = (dowMask >> 1) & WEEK_MASK
+        shift = self.firstWeekDays[month]-1
+        week = ((week >> shift) | (week << (7-shift))) & WEEK_MASK
+        days = self.monthDays[month]
+
+        return (domMask & days,((week * WEEK_REPEAT) << 1) & days)
+
+class FireSchedule():
+    """ time fields of an entry indexed to find when it fires in its job tz.
+    months, hours and minutes are sorted values, so the next match is
+    bisected for instead of stepping a minute at a time"""
+    def __init__(self,record,jobTz):
+        masks = EntryMasks(record,GetDefaultValues()._replace(month=MONTH_MASK))
+        self.jobTz = jobTz
+        self.dom = masks.dom
+        self.dow = masks.dow
+        self.months = tuple(MaskToValues(masks.month & MONTH_MASK))
+        self.hours = tuple(MaskToValues(masks.hour))
+        self.minutes = tuple(MaskToValues(masks.minute))
+        """with no dow, only the dom days need a look"""
+        self.days = tuple(MaskToValues(masks.dom)) if masks.dow == 0 else tuple(range(1,32))
+
+    def IsDayHit(self,year,month,day):
+        """dom or dow hit, dom/dow of a '*' are cleared by GetEntryDefaults()"""
+        return (self.dom >> day) & 1 == 1 or (self.dow >> GetCalendarIndex(year).GetWeekDay(month,day)) & 1 == 1
+
+    def GetLocalTimes(self,ts):
+        """ yield naive job tz times the entry fires at, from ts on, ascending.
+        gives up when nothing fires for FIRE_SEARCH_YEARS, 31 2 for one"""
+        if not (self.months and self.hours and self.minutes):
+            return
+
+        (year,month,day,hour,minute) = (ts.year,ts.month,ts.day,ts.hour,ts.minute)
+        lastYear = year + FIRE_SEARCH_YEARS
+        while year <= lastYear:
+            idx = bisect.bisect_left(self.months,month)
+            if idx == len(self.months):
+                (year,month,day,hour,minute) = (year+1,self.months[0],1,0,0)
+                continue
+            elif self.months[idx] != month:
+                (month,day,hour,minute) = (self.months[idx],1,0,0)
+
+            monthDays = GetCalendarIndex(year).GetMonthLength(month)
+            for hitDay in self.days[bisect.bisect_left(self.days,day):]:
+                if hitDay > monthDays:
+                    break
+                elif self.IsDayHit(year,month,hitDay):
+                    (fromHour,fromMin) = (hour,minute) if hitDay == day else (0,0)
+                    for hr in self.hours[bisect.bisect_left(self.hours,fromHour):]:
+                        firstMin = fromMin if hr == fromHour else 0
+                        for mins in self.minutes[bisect.bisect_left(self.minutes,firstMin):]:
+                            yield datetime.datetime(year,month,hitDay,hr,mins)
+                            lastYear = year + FIRE_SEARCH_YEARS
+
+            (year,month) = divmod(year*12+month,12)
+            (month,day,hour,minute) = (month+1,1,0,0)
+
+class FieldToken(collections.namedtuple('FieldToken',['kind','start','end','step','items'])):
+    """ a field of a cron entry parsed once, see ParseField(). kind is one of
+    TOKEN_STAR      *
+    TOKEN_NUMBER    5           start == end
+    TOKEN_RANGE     1-5,1-10/2  start,end,step
+    TOKEN_STEP      */15,30/2   start,end,step. start,end are field limits when not written
+    TOKEN_LIST      1,3-5       items, tokens of the parts"""
+    __slots__ = ()
+
+class OutputWriter():
+    """ output of Main(). a block, an input line and its converted lines, is
+    written with one write() and the output is flushed once, on Close().
+    with atomic, outFile is written to a temp file in its dir and renamed over
+    outFile on Close(), so a reader never sees it half written"""
+    def __init__(self,outFile=None,atomic=False):
+        self.outFile = outFile
+        self.tmpFile = None
+        if outFile == None:
+            self.fileObj = sys.stdout
+        elif atomic:
+            import tempfile
+            (fd,self.tmpFile) = tempfile.mkstemp(prefix='.'+os.path.basename(outFile)+'.',dir=os.path.dirname(os.path.abspath(outFile)))
+            self.fileObj = os.fdopen(fd,'w')
+        else:
+            self.fileObj = open(outFile,'w')
+
+    def Write(self,block):
+        self.fileObj.write(block)
+
+    def Close(self):
+        self.fileObj.flush()
+        if self.outFile == None:
+            return
+
+        if self.tmpFile != None:
+            os.fsync(self.fileObj.fileno())
+            try:
+                os.chmod(self.tmpFile,os.stat(self.outFile).st_mode & 0o7777)
+            except FileNotFoundError:
+                os.chmod(self.tmpFile,0o644)
+
+        self.fileObj.close()
+        if self.tmpFile != None:
+            os.replace(self.tmpFile,self.outFile)
+            self.tmpFile = None
+
+    def Discard(self):
+        """drop a partial output, outFile is left as it was when atomic"""
+        if self.outFile == None:
+            self.fileObj.flush()
+            return
+
+        self.fileObj.close()
+        if self.tmpFile != None:
+            os.remove(self.tmpFile)
+            self.tmpFile = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,excType,excValue,traceback):
+        if excType == None:
+            self.Close()
+        else:
+            self.Discard()
+
+class CronTzConverter():
+    """ converts crontab lines, entries after a JOB_TZ line are adjusted to
+    SERVER_TZ. holds the defaults, tz backend and dst policy of a run, at
+    module level there are only caches, so converters can be used on many
+    threads at once, with a backend each.
+    now, a datetime, fixes the default month and year, see GetDefaultValues().
+    with cache, an EntryCache, converted time fields of an entry are looked up
+    there first. with windowMonths, entries are converted for that many months
+    from now instead, see GetWindowBlock(). with stats, a ConversionStats,
+    stages of every JOB_TZ entry are timed. entries are then converted in
+    this process, not on an executor, so times are of the stages alone.
+    zones are looked up with tzBackend, a name of TZ_BACKENDS, default as
+    GetTzBackend(). caches at module level are keyed by the backend too.
+    dstPolicy, a DstPolicy, is for times dst changes skip or repeat. with
+    noteFile, a line from GetDstNotes() is written there for every entry
+    with such times. engine, a name of ADJUST_ENGINES, adjusts the entries,
+    see GetAdjustFunc(). numpy is for a year, not a window, ValueError with
+    windowMonths"""
+    def __init__(self,now=None,cache=None,windowMonths=None,stats=None,dstPolicy=None,noteFile=None,tzBackend=None,engine=None):
+        self.defaults = GetDefaultValues(now)
+        self.backend = GetTzBackend(tzBackend)
+        self.engine = engine
+        self.cache = cache
+        self.stats = stats
+        self.dstPolicy = dstPolicy
+        self.noteFile = noteFile
+        self.window = None
+        if windowMonths != None:
+            if engine == 'numpy':
+                raise ValueError('numpy engine does not convert over a window, only python does')
+            self.window = GetWindow(now,windowMonths)
+
+    def GetLineTasks(self,lines):
+        """ yield (line,serverTz,jobTz,isEntry) for every line. jobTz is None
+        but for an entry right after a JOB_TZ line, the only ones converted.
+        a crontab's SERVER_TZ/JOB_TZ state lives here only"""
+        serverTz = ''
+        jobTz = ''
+        isJobTzSet = False
+        for line in lines:
+            if REGEX_PATTERNS['job_tz'].match(line):
+                jobTz = line.split('=')[1].strip()
+                isJobTzSet = True
+
+            if REGEX_PATTERNS['server_tz'].match(line):
+                serverTz = line.split('=')[1].strip()
+                yield (line,serverTz,None,False)
+            elif REGEX_PATTERNS['comment'].match(line):
+                yield (line,serverTz,None,False)
+            elif REGEX_PATTERNS['blank_line'].match(line):
+                yield (line,serverTz,None,False)
+            elif REGEX_PATTERNS['variable'].match(line):
+                yield (line,serverTz,None,False)
+            elif isJobTzSet:
+                yield (line,serverTz,jobTz,True)
+                isJobTzSet = False
+            else:
+                yield (line,serverTz,None,True)
+
+    def ConvertBlocks(self,lines,executor=None):
+        """ yield output block for every line, the line and the lines it is
+        converted to. with executor, a concurrent.futures executor, entries
+        to convert are sent to it. blocks are still yielded in input order"""
+        pending = []
+        for (line,serverTz,jobTz,isEntry) in self.GetLineTasks(lines):
+            started = self.StartBlock(line,serverTz,jobTz,isEntry,executor)
+            if executor == None:
+                yield self.FinishBlock(started)
+            else:
+                pending.append(started)
+
+        for started in pending:
+            yield self.FinishBlock(started)
+
+        if self.cache != None:
+            self.cache.Commit()
+
+    def StartBlock(self,line,serverTz,jobTz,isEntry,executor):
+        """ output block of a line when it is ready, else what FinishBlock()
+        needs to make it: (line,command,cacheKey,times), times can be a future"""
+        if jobTz == None:
+            return ConvertLine(line,serverTz,jobTz,isEntry,self.defaults,self.backend)
+
+        entryAsRecord = GetLineAsRecord(line)
+        entryStats = None
+        if self.stats != None:
+            entryStats = self.stats.AddEntry(line,serverTz,jobTz)
+            executor = None
+
+        if self.noteFile != None:
+            self.WriteDstNotes(line,entryAsRecord,jobTz)
+
+        if self.window != None:
+            if executor == None:
+                return GetWindowBlock(line,entryAsRecord,serverTz,jobTz,self.defaults,self.window,entryStats,self.dstPolicy,self.backend)
+            else:
+                return executor.submit(GetWindowBlock,line,entryAsRecord,serverTz,jobTz,self.defaults,self.window,None,self.dstPolicy,self.backend)
+
+        cacheKey = None
+        if self.cache != None:
+            cacheKey = GetEntryCacheKey(EntryMasks(entryAsRecord,self.defaults),serverTz,jobTz,self.dstPolicy,self.backend)
+            times = self.cache.Get(cacheKey)
+            if times != None:
+                if entryStats != None:
+                    entryStats.cached = True
+                return FormatTimesAsBlock(line,entryAsRecord['command'],times)
+
+        if executor == None:
+            times = GetEntryTimes(entryAsRecord,serverTz,jobTz,self.defaults,entryStats,self.dstPolicy,self.backend,self.engine)
+        else:
+            times = executor.submit(GetEntryTimes,entryAsRecord,serverTz,jobTz,self.defaults,None,self.dstPolicy,self.backend,self.engine)
+
+        return (line,entryAsRecord['command'],cacheKey,times)
+
+    def WriteDstNotes(self,line,record,jobTz):
+        """GetDstNotes() of an entry to noteFile, a line each, after the entry"""
+        if self.window != None:
+            masks = EntryMasks(record,self.defaults._replace(month=MONTH_MASK))
+            (start,end) = self.window
+        else:
+            masks = EntryMasks(record,self.defaults)
+            (start,end) = (datetime.datetime(masks.year,1,1),datetime.datetime(masks.year+1,1,1))
+
+        for note in GetDstNotes(masks,jobTz,start,end,self.dstPolicy,self.backend):
+            PrintLine("{0}: {1}\n".format(line.strip(),note),fileObj=self.noteFile)
+
+    def FinishBlock(self,started):
+        if isinstance(started,list):
+            return started
+        elif not isinstance(started,tuple):
+            """a future of an executor"""
+            return started.result()
+
+        (line,command,cacheKey,times) = started
+        if not isinstance(times,list):
+            times = times.result()
+
+        if cacheKey != None:
+            self.cache.Put(cacheKey,times)
+
+        return FormatTimesAsBlock(line,command,times)
+
+    def Convert(self,crontab,executor=None):
+        """crontab, a string or lines, converted. returns output lines"""
+        if isinstance(crontab,str):
+            crontab = io.StringIO(crontab)
+
+        outLines = []
+        for block in self.ConvertBlocks(crontab,executor=executor):
+            outLines.extend(block)
+
+        return outLines
+
+class EntryCache():
+    """ on disk cache of converted entries, an sqlite file that can be shared
+    by processes. maps GetEntryCacheKey() of an entry to its tz adjusted time
+    fields, command is not part of it so entries differing only in command
+    share it. keys least recently used are dropped beyond maxEntries"""
+    def __init__(self,path,maxEntries=None):
+        self.maxEntries = maxEntries if maxEntries != None else ENTRY_CACHE_MAX_ENTRIES
+        import sqlite3
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path,timeout=ENTRY_CACHE_TIMEOUT,check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, times TEXT NOT NULL, used INTEGER NOT NULL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS entries_used ON entries (used)')
+        self.db.commit()
+        """used is a counter, bumped for every Get()/Put(). lowest is evicted first"""
+        self.clock = self.db.execute('SELECT COALESCE(MAX(used),0) FROM entries').fetchone()[0]
+
+    def Get(self,key):
+        """time fields texts of key, None if not cached"""
+        with self.lock:
+            row = self.db.execute('SELECT times FROM entries WHERE key = ?',(key,)).fetchone()
+            if row == None:
+                return None
+
+            self.clock += 1
+            self.db.execute('UPDATE entries SET used = ? WHERE key = ?',(self.clock,key))
+
+        return row[0].split('\n') if row[0] else []
+
+    def Put(self,key,times):
+        with self.lock:
+            self.clock += 1
+            self.db.execute('INSERT OR REPLACE INTO entries (key,times,used) VALUES (?,?,?)',(key,'\n'.join(times),self.clock))
+
+    def Commit(self):
+        """write changes, dropping least recently used keys beyond maxEntries"""
+        with self.lock:
+            self.db.execute('DELETE FROM entries WHERE used <= (SELECT used FROM entries ORDER BY used DESC LIMIT 1 OFFSET ?)',(self.maxEntries,))
+            self.db.commit()
+
+    def Close(self):
+        self.Commit()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,excType,excValue,traceback):
+        self.Close()
+
+class EntryStats():
+    """ stages a JOB_TZ entry went through, see RunStage(). each stage is
+    (stage,secs,entries in,entries out), in is None when not counted"""
+    def __init__(self,line,serverTz,jobTz):
+        self.line = line
+        self.serverTz = serverTz
+        self.jobTz = jobTz
+        self.cached = False
+        self.stages = []
+
+    def Run(self,stage,func,entries,*args):
+        """func(entries,*args) timed, a generator it returns is run out too"""
+        countIn = len(entries) if isinstance(entries,list) else None
+        start = time.perf_counter()
+        result = func(entries,*args)
+        if not isinstance(result,list):
+            result = list(result)
+        self.stages.append((stage,time.perf_counter() - start,countIn,len(result)))
+
+        return result
+
+class ConversionStats():
+    """ EntryStats of every JOB_TZ entry converted, to find slow lines and
+    merges that do not shrink anything. written as json or prometheus text"""
+    def __init__(self):
+        self.entries = []
+
+    def AddEntry(self,line,serverTz,jobTz):
+        entryStats = EntryStats(line,serverTz,jobTz)
+        self.entries.append(entryStats)
+        return entryStats
+
+    def GetStageTotals(self):
+        """{stage: [calls,secs,entries in,entries out]}, in order of first run"""
+        totals = collections.OrderedDict()
+        for entryStats in self.entries:
+            for (stage,secs,countIn,countOut) in entryStats.stages:
+                total = totals.setdefault(stage,[0,0.0,0,0])
+                total[0] += 1
+                total[1] += secs
+                total[2] += countIn if countIn != None else 0
+                total[3] += countOut
+
+        return totals
+
+    def AsJson(self):
+        entries = []
+        for (idx,entryStats) in enumerate(self.entries):
+            entries.append({
+                'index': idx,
+                'entry': entryStats.line.rstrip('\n'),
+                'server_tz': entryStats.serverTz,
+                'job_tz': entryStats.jobTz,
+                'cached': entryStats.cached,
+                'secs': sum(stage[1] for stage in entryStats.stages),
+                'stages': [{'stage': stage,'secs': secs,'in': countIn,'out': countOut}
+                    for (stage,secs,countIn,countOut) in entryStats.stages],
+            })
+        totals = {stage: {'calls': calls,'secs': secs,'in': countIn,'out': countOut}
+                for (stage,(calls,secs,countIn,countOut)) in self.GetStageTotals().items()}
+
+        import json
+        return json.dumps({'entries': entries,'stages': totals},indent=1)
+
+    def AsPrometheus(self):
+        lines = []
+        totals = self.GetStageTotals()
+        for (idx,name,kind,text) in (
+                (0,'stage_calls_total','counter','times a stage was run'),
+                (1,'stage_seconds_total','counter','wall time of a stage'),
+                (2,'stage_entries_in_total','counter','entries into a stage'),
+                (3,'stage_entries_out_total','counter','entries out of a stage')):
+            lines.append("# HELP {0}{1} {2}".format(STATS_METRIC_PREFIX,name,text))
+            lines.append("# TYPE {0}{1} {2}".format(STATS_METRIC_PREFIX,name,kind))
+            for (stage,total) in totals.items():
+                lines.append('{0}{1}{{stage="{2}"}} {3}'.format(STATS_METRIC_PREFIX,name,stage,total[idx]))
+
+        lines.append("# HELP {0}entry_seconds wall time of converting an entry".format(STATS_METRIC_PREFIX))
+        lines.append("# TYPE {0}entry_seconds gauge".format(STATS_METRIC_PREFIX))
+        for (idx,entryStats) in enumerate(self.entries):
+            entry = entryStats.line.rstrip('\n').replace('\\','\\\\').replace('"','\\"')
+            lines.append('{0}entry_seconds{{index="{1}",job_tz="{2}",entry="{3}"}} {4}'.format(STATS_METRIC_PREFIX,
+                    idx,entryStats.jobTz,entry,sum(stage[1] for stage in entryStats.stages)))
+
+        return '\n'.join(lines) + '\n'
+
+class EntryMasks():
+    """ time fields of a cron record parsed once into bitmasks.
+    shared by expansion, tz adjustment and output of the record.
+    '*' fields are taken from defaults, see GetEntryDefaults()"""
+    def __init__(self,record,defaults):
+        self.record = record
+        defaults = GetEntryDefaults(record,defaults)
+        self.year = defaults.year
+        self.minute = ExpandMinutes(record['minute'],defaults)
+        self.hour = ExpandHour(record['hour'],defaults)
+        self.dom = ExpandDoM(record['dom'],defaults)
+        self.month = ExpandMonths(record['month'],defaults)
+        self.dow = ExpandDoW(record['dow'],defaults)
+
+        self.isHourAstreisk = ParseField('hour',record['hour']).kind == TOKEN_STAR
+        self.isMonthAstreisk = ParseField('month',record['month']).kind == TOKEN_STAR
+        self.isDoWAstreisk = ParseField('dow',record['dow']).kind == TOKEN_STAR
+        """dom as written in the entry, copied as it is to adjusted entries"""
+        self.domAsWritten = TokenToMask(ParseField('dom',record['dom']))
+        self.command = record['command']
+
+
+""" a field is kept as a bitmask, bit n set when value n is in the field.
+'*' in output is FIELD_STAR, all bits set, so it matches any value too"""
+FIELD_STAR = -1
+MINUTE_MASK = (1<<60)-1
+HOUR_MASK = (1<<24)-1
+DOM_MASK = ((1<<31)-1) << 1
+MONTH_MASK = ((1<<12)-1) << 1
+DOW_MASK = ((1<<7)-1) << 1
+WEEK_MASK = (1<<7)-1 ## a dow mask shifted to bit 0, see CalendarIndex.GetHitDays()
+WEEK_REPEAT = sum(1 << (7*week) for week in range(5)) ## a 7 bit week times this is laid over 5 weeks, a month at most
+
+class DefaultValues(collections.namedtuple('DefaultValues',['minute','hour','dom','month','dow','year'])):
+    """ masks used for '*' fields and the year entries are expanded for.
+    worked out once per run by GetDefaultValues(), never modified. an entry
+    gets its own copy from GetEntryDefaults()"""
+    __slots__ = ()
+
+class DstPolicy(collections.namedtuple('DstPolicy',['gap','overlap'])):
+    """ what to do with job tz wall clock times a dst change skips, gap is
+    'shift' to move them later by the length of the gap or 'skip', and
+    those it repeats, overlap is 'once', in the second pass, or 'twice'.
+    see GetDstMinutes()"""
+    __slots__ = ()
 
 VALID_SPECIAL_STRINGS = [
     '@reboot',
@@ -52,96 +754,189 @@ VALID_SPECIAL_STRINGS = [
 ]
 
 
-REGEX_PATTERNS = {
-    'server_tz' : re.compile('^#\s*SERVER_TZ='),
-    'job_tz' : re.compile('^#\s*JOB_TZ='),
-    'comment' : re.compile('^\s*#'),
-    'blank_line' : re.compile('^\s*$'),
-    'variable' : re.compile('^\s*\w+='),
-    'parse_entry' : re.compile('\s'),
-    'astreisk' : re.compile('^\s*\*\s*$'),
-    'is_num_only' : re.compile('^\s*\d+\s*$'),
-    'number' : re.compile('\d'),
-    'range' : re.compile('-'),
-    'list' : re.compile(','),
-    'step' : re.compile('/'),
-    'week_day_abbr' : re.compile('mon|tue|wed|thu|fri|sat|sun',re.I),
-    'month_abbr' : re.compile('jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec',re.I)
-}
+class RegexPatterns(dict):
+    """patterns by name, compiled on first use, so a run pays only for the ones it uses"""
+    def __init__(self,sources):
+        super().__init__()
+        self.sources = sources
+
+    def __missing__(self,name):
+        pattern = self[name] = re.compile(self.sources[name])
+        return pattern
+
+REGEX_PATTERNS = RegexPatterns({
+    'server_tz' : '^#\s*SERVER_TZ=',
+    'job_tz' : '^#\s*JOB_TZ=',
+    'comment' : '^\s*#',
+    'blank_line' : '^\s*$',
+    'variable' : '^\s*\w+=',
+    'parse_entry' : '\s',
+    'is_num_only' : '^\s*\d+\s*$',
+    'valid_period' : '^#\s*VALID_FROM=(\S+ \S+)\s+VALID_TO=(\S+ \S+)',
+})
 
 ENTRY_ORDER = ['minute', 'hour', 'dom', 'month', 'dow', 'command']
 ENTRY_TIME_FIELDS = [ 'month', 'dom', 'dow', 'hour', 'minute' ]
-ENTRY_SORT_ORDER = [ 'month', 'dom', 'hour', 'minute', 'dow'] ## sort in this order
-SQUEEZE_ORDER = [ 'minute', 'hour', 'dom', 'month', 'dow'] ## squeeze in this order
-SQUEEZE_FILED_OBJS = {}
-
-WEEK_DAY_SHORT_NAMES = []
-MONTH_SHORT_NAMES = []
+ENTRY_SORT_ORDER = [ 'month', 'dom', 'hour', 'minute', 'dow'] ## sort in this order, see GenerateSortKey()
+FIELD_LIMITS = {
+    'minute' : (0,59),
+    'hour' : (0,23),
+    'dom' : (1,31),
+    'month' : (1,12),
+    'dow' : (1,7),
+}
 
-def SetSqueezeFieldObjects():
-    global SQUEEZE_FILED_OBJS
+TOKEN_STAR = 'star'
+TOKEN_NUMBER = 'number'
+TOKEN_RANGE = 'range'
+TOKEN_STEP = 'step'
+TOKEN_LIST = 'list'
 
-    SQUEEZE_FILED_OBJS['dom'] =  SqueezeFieldObject('dom',1,31)
-    SQUEEZE_FILED_OBJS['dow'] =  SqueezeFieldObject('dow',1,7)
-    SQUEEZE_FILED_OBJS['month'] =  SqueezeFieldObject('month',1,12)
-    SQUEEZE_FILED_OBJS['minute'] =  SqueezeFieldObject('minute',0,59)
-    SQUEEZE_FILED_OBJS['hour'] =  SqueezeFieldObject('hour',0,59)
+SORT_KEY_FIELD_BITS = 70 ## FieldSortKey(), 6 bits of lowest value over a 64 bit mask
+SQUEEZE_ORDER = [ 'minute', 'hour', 'dom', 'month', 'dow'] ## squeeze in this order
+SQUEEZE_FILED_OBJS = {
+    'dom' : SqueezeFieldObject('dom',1,31),
+    'dow' : SqueezeFieldObject('dow',1,7),
+    'month' : SqueezeFieldObject('month',1,12),
+    'minute' : SqueezeFieldObject('minute',0,59),
+    'hour' : SqueezeFieldObject('hour',0,59),
+}
+CALENDAR_INDEX_CACHE_SIZE = 64 ## years kept by GetCalendarIndex()
+FIELD_TOKEN_CACHE_SIZE = 1024 ## (field,text) tokens kept by ParseField()
+OFFSET_TABLE_CACHE_SIZE = 256 ## (serverTz,jobTz,year) tables kept by GetOffsetTable()
+ZONE_TABLE_CACHE_SIZE = 256 ## (tzName,year) tables kept by GetZoneTable(), and transitions by GetZoneYearTransitions()
+ZONE_SCAN_STEP = datetime.timedelta(hours=6) ## offsets looked at this often for transitions of zones that don't list them, no zone changes twice in it
+DST_GAP_FOLD = 0 ## a time in a dst gap keeps the offset from before it, so is moved later by the length of the gap
+DST_OVERLAP_FOLD = 1 ## a time in a dst overlap is taken in its second pass, standard time of a dst zone
+DST_GAP_POLICIES = ('shift','skip')
+DST_OVERLAP_POLICIES = ('once','twice')
+DST_WINDOW_CACHE_SIZE = 256 ## (jobTz,year) windows kept by GetDstWindows(), and minutes by GetDstMinutes()
+DST_NOTE_SHOW_TIMES = 3 ## times listed per dst note by GetDstNotes()
+STATS_METRIC_PREFIX = 'cron_tz_conv_' ## of ConversionStats.AsPrometheus() metrics
+ENTRY_CACHE_VERSION = 2 ## part of EntryCache keys, bump when converted output changes
+ENTRY_CACHE_MAX_ENTRIES = 100000
+ENTRY_CACHE_TIMEOUT = 30 ## secs to wait for another process holding the cache
+FIRE_SCHEDULE_CACHE_SIZE = 1024 ## (fields,jobTz) schedules kept by GetFireSchedule()
+FIRE_SEARCH_YEARS = 8 ## a 29 2 entry may not fire for 8 years, 2096 to 2104
+FIRE_REORDER_WINDOW = datetime.timedelta(hours=3) ## more than any dst shift, see GetFireTimes()
+VERIFY_SHOW_FIRES = 3 ## missing/extra fire times listed per entry by VerifyCrontab()
+WATCH_INTERVAL = 2 ## secs between polls of --watch
+BATCH_STATE_FILE = '.cron_tz_conv.state' ## in outdir, content hashes of last ConvertFiles() run
+TZ_BACKENDS = {
+    'pytz' : PytzBackend,
+    'zoneinfo' : ZoneInfoBackend,
+    'table' : TransitionTableBackend,
+}
+DEFAULT_DST_POLICY = DstPolicy(DST_GAP_POLICIES[0],DST_OVERLAP_POLICIES[0]) ## same as DST_GAP_FOLD, DST_OVERLAP_FOLD
+ADJUST_ENGINES = ('python','numpy') ## see GetAdjustFunc()
+MINUTES_PER_DAY = 24*60
 
 
-def SetWeekDayShortNames():
-    global WEEK_DAY_SHORT_NAMES
-    WEEK_DAY_SHORT_NAMES = []
-    for i in range(7):
-        WEEK_DAY_SHORT_NAMES.append(calendar.day_abbr[i].lower())
+SORT_KEY = operator.attrgetter('sortKey')
 
-def SetMonthShortNames():
-    global MONTH_SHORT_NAMES
-    MONTH_SHORT_NAMES = []
-    for i in range(1,12+1):
-        MONTH_SHORT_NAMES.append(calendar.month_abbr[i].lower())
+@functools.lru_cache(maxsize=None)
+def GetShortNames():
+    """(week day names,month names), short and lower case, built on first use"""
+    return (tuple(calendar.day_abbr[i].lower() for i in range(7)),
+            tuple(calendar.month_abbr[i].lower() for i in range(1,12+1)))
 
 def GetMonthNoForShortName(inp):
     try:
-        return MONTH_SHORT_NAMES.index(inp.lower())+1
+        return GetShortNames()[1].index(inp.lower())+1
     except ValueError:
         return -1
 
 def GetWeekDayNoForShortName(inp):
     try:
-        return WEEK_DAY_SHORT_NAMES.index(inp.lower())+1
+        return GetShortNames()[0].index(inp.lower())+1
     except ValueError:
         return -1
 
-def SetDefaultValuesDomDow(entry):
-    """modify global defaults based on entrie's dom/dow"""
-    global DEFAULT_VALUES
-    if REGEX_PATTERNS['astreisk'].match(entry['dom']) and REGEX_PATTERNS['astreisk'].match(entry['dow']):
+def MaskFromValues(values):
+    mask = 0
+    for v in values:
+        mask |= 1 << v
+
+    return mask
+
+def MaskToValues(mask):
+    """values of the set bits, ascending"""
+    values = []
+    while mask:
+        low = mask & -mask
+        values.append(low.bit_length()-1)
+        mask ^= low
+
+    return values
+
+def IsSingleValue(mask):
+    return mask > 0 and mask & (mask-1) == 0
+
+def GetSingleValue(mask):
+    """value of a field that has exactly one value, like int() of '5'"""
+    if IsSingleValue(mask):
+        return mask.bit_length()-1
+    else:
+        raise ValueError("field {0:b} is not a single value".format(mask))
+
+def MaskToCronText(mask):
+    """ minimal cron text for a field mask.
+    runs of 2+ consecutive values become a-b, runs of 3+ with same step a-b/step"""
+    if mask == FIELD_STAR:
+        return '*'
+
+    values = MaskToValues(mask)
+    parts = []
+    idx = 0
+    total = len(values)
+    while idx < total:
+        end = idx
+        if idx+1 < total:
+            stepVal = values[idx+1] - values[idx]
+            end = idx+1
+            while end+1 < total and values[end+1]-values[end] == stepVal:
+                end+=1
+
+        if end > idx and stepVal == 1:
+            parts.append("{0}-{1}".format(values[idx],values[end]))
+        elif end > idx+1:
+            parts.append("{0}-{1}/{2}".format(values[idx],values[end],stepVal))
+        else:
+            parts.append(str(values[idx]))
+            end = idx
+
+        idx = end+1
+
+    return ','.join(parts)
+
+def GetEntryDefaults(entry,defaults):
+    """defaults for an entry, adjusted for entrie's dom/dow"""
+    isDomStar = ParseField('dom',entry['dom']).kind == TOKEN_STAR
+    isDowStar = ParseField('dow',entry['dow']).kind == TOKEN_STAR
+    if isDomStar and isDowStar:
         """lets use global defaults"""
-        pass
-    elif REGEX_PATTERNS['number'].search(entry['dom']) and REGEX_PATTERNS['number'].search(entry['dow']):
+        return defaults
+    elif not isDomStar and not isDowStar:
         """here its just default, actual values will be generated by routines further down"""
-        pass
-    elif REGEX_PATTERNS['number'].search(entry['dow']):
+        return defaults
+    elif not isDowStar:
         """since dow will be set further down, we can clear dom"""
-        DEFAULT_VALUES['dom'] = []
-    elif REGEX_PATTERNS['number'].search(entry['dom']):
-        """since dom will be set further down, we can clear dow"""
-        DEFAULT_VALUES['dow'] = []
+        return defaults._replace(dom=0)
     else:
-        pass
-
-def SetDefaultValues():
-    global DEFAULT_VALUES
+        """since dom will be set further down, we can clear dow"""
+        return defaults._replace(dow=0)
 
-    td = pytz.datetime.datetime.now()
-    DEFAULT_VALUES['year'] = [td.year]
-    DEFAULT_VALUES['minute'] = [x for x in range(0,59+1)]
-    DEFAULT_VALUES['hour'] = [x for x in range(0,23+1)]
-    DEFAULT_VALUES['month'] = [td.month] # for month it is ok.
-    DEFAULT_VALUES['dom'] = [] # since its either dom/dow, we take default dow. 
-    DEFAULT_VALUES['dow'] = [x for x in range(1,7+1)]
+def GetDefaultValues(now=None):
+    """defaults for a run, month and year are of now, current time if not given"""
+    td = now if now != None else datetime.datetime.now()
 
-    return
+    return DefaultValues(
+        minute = MINUTE_MASK,
+        hour = HOUR_MASK,
+        dom = 0, # since its either dom/dow, we take default dow.
+        month = 1 << td.month, # for month it is ok.
+        dow = DOW_MASK,
+        year = td.year)
 
 def IsValidCronEntry(line):
     return True
@@ -163,112 +958,118 @@ def ParseCronEntry(line):
 
     return dict(zip(ENTRY_ORDER,values))
 
-def ExpandRange(r,s=1):
-    """expand 1-5 to [1..5], step by 1-10/2"""
-    if REGEX_PATTERNS['step'].search(r):
-        [r1,s] = r.split('/')
-        s=int(s)
+def ParseFieldValue(field,inp):
+    """number, or month/week day short name, in a field. None when it is neither"""
+    if inp.isdigit():
+        return int(inp)
+    elif field == 'month':
+        value = GetMonthNoForShortName(inp)
+    elif field == 'dow':
+        value = GetWeekDayNoForShortName(inp)
     else:
-        r1 = r
-
-    (start,end) = r1.split('-')
-    return [i for i in range(int(start),int(end)+1,s)]
-
-def NormalizeEntry(inp,stepStartVal=1):
-    """ break range, 1-5, and list 1,2,3 into individual values"""
-    expanded = []
-    if REGEX_PATTERNS['list'].search(inp):
-        for entry in inp.split(','):
-            if REGEX_PATTERNS['range'].search(entry):
-                expanded.extend(ExpandRange(entry))
-            else:
-                expanded.append(entry)
-    elif REGEX_PATTERNS['range'].search(inp):
-        expanded.extend(ExpandRange(inp))
-    elif REGEX_PATTERNS['step'].search(inp):
-        inp = str(stepStartVal) + '-' + inp
-        expanded.extend(ExpandRange(inp))
+        value = -1
+
+    return value if value >= 0 else None
+
+def ParseFieldPart(field,inp):
+    """ token for a part of a field with no ',' in it. None when it can't be
+    parsed, such parts are skipped as before"""
+    (low,high) = FIELD_LIMITS[field]
+    (rangeInp,isStep,stepInp) = inp.partition('/')
+    step = 1
+    if isStep:
+        step = ParseFieldValue('',stepInp)
+        if not step:
+            return None
+
+    if rangeInp == '*':
+        if not isStep:
+            return FieldToken(TOKEN_STAR,low,high,1,())
+        (kind,start,end) = (TOKEN_STEP,low,high)
+    elif '-' in rangeInp:
+        (startInp,endInp) = rangeInp.split('-',1)
+        (kind,start,end) = (TOKEN_RANGE,ParseFieldValue(field,startInp),ParseFieldValue(field,endInp))
+    elif isStep:
+        """30/2 is 1-30/2, range starts with lowest value of field"""
+        (kind,start,end) = (TOKEN_STEP,low,ParseFieldValue(field,rangeInp))
     else:
-        expanded = [ inp ] # expanded.append(inp) too will do
-
-    retVal = []
-    for x in expanded:
-        try:
-            retVal.append(int(x))
-        except ValueError:
-            pass
-
-    return retVal
-
-def ExpandMonths(inp):
-    if REGEX_PATTERNS['astreisk'].match(inp):
-        return DEFAULT_VALUES['month']
-    elif REGEX_PATTERNS['month_abbr'].match(inp):
-        if REGEX_PATTERNS['list'].search(inp):
-            monthNames = inp.split(',')
-            months = []
-            for m in monthNames:
-                months.append(str(GetMonthNoForShortName(m)))
-
-            inp = ','.join(months)
-        else:
-            inp = str(GetMonthNoForShortName(inp))
-
-    return NormalizeEntry(inp)
+        (kind,start,end) = (TOKEN_NUMBER,ParseFieldValue(field,rangeInp),None)
+        end = start
+
+    if start is None or end is None:
+        return None
+
+    return FieldToken(kind,start,end,step,())
+
+@functools.lru_cache(maxsize=FIELD_TOKEN_CACHE_SIZE)
+def ParseField(field,inp):
+    """ a field as written parsed into a FieldToken. done once for a field's
+    text, later stages look at the token kind and values only"""
+    inp = inp.strip()
+    if ',' in inp:
+        items = tuple(t for t in (ParseFieldPart(field,x) for x in inp.split(',')) if t is not None)
+        return FieldToken(TOKEN_LIST,None,None,None,items)
+
+    token = ParseFieldPart(field,inp)
+    if token is None:
+        return FieldToken(TOKEN_LIST,None,None,None,())
+
+    return token
+
+def TokenToMask(token):
+    """mask of values in a FieldToken, FIELD_STAR for '*'"""
+    if token.kind == TOKEN_STAR:
+        return FIELD_STAR
+    elif token.kind == TOKEN_NUMBER:
+        return 1 << token.start
+    elif token.kind == TOKEN_LIST:
+        mask = 0
+        for item in token.items:
+            mask |= TokenToMask(item)
+        return mask
+    else:
+        return MaskFromValues(range(token.start,token.end+1,token.step))
 
-def ExpandDoM(inp):
-    if REGEX_PATTERNS['astreisk'].match(inp):
-        return DEFAULT_VALUES['dom']
+def ExpandField(field,inp,defaults):
+    """mask of values of a field, for '*' the default of the field"""
+    token = ParseField(field,inp)
+    if token.kind == TOKEN_STAR:
+        return getattr(defaults,field)
     else:
-        return NormalizeEntry(inp)
-
-def ExpandDoW(inp):
-    if REGEX_PATTERNS['astreisk'].match(inp):
-        return DEFAULT_VALUES['dow']
-    elif REGEX_PATTERNS['week_day_abbr'].match(inp):
-        if REGEX_PATTERNS['list'].search(inp):
-            wdNames = inp.split(',')
-            wd = []
-            for m in wdNames:
-                wd.append(str(GetWeekDayNoForShortName(m)))
-
-            inp = ','.join(wd)
-        else:
-            inp = str(GetWeekDayNoForShortName(inp))
+        return TokenToMask(token)
 
-    return NormalizeEntry(inp)
+def ExpandMonths(inp,defaults):
+    return ExpandField('month',inp,defaults)
 
-def ExpandHour(inp):
-    if REGEX_PATTERNS['astreisk'].match(inp):
-        return DEFAULT_VALUES['hour']
-    else:
-        return NormalizeEntry(inp,stepStartVal=0)
+def ExpandDoM(inp,defaults):
+    return ExpandField('dom',inp,defaults)
 
-def ExpandMinutes(inp):
-    if REGEX_PATTERNS['astreisk'].match(inp):
-        return DEFAULT_VALUES['minute']
-    else:
-        return NormalizeEntry(inp,stepStartVal=0)
+def ExpandDoW(inp,defaults):
+    """dow mask, 0 is sunday as cron reads it, the same bit as 7"""
+    mask = ExpandField('dow',inp,defaults)
+    if mask != FIELD_STAR and mask & 1:
+        mask = (mask & ~1) | (1 << 7)
+    return mask
 
-def GetEntryAsTimeStamps(record,tz):
-    """ given a dict, rep a cron entry.
-    convert in into datetime() - which can be used for tz adjustment
-    this can for some instances generate 60*60*24*31/7 entries."""
-    expandedTs = []
+def ExpandHour(inp,defaults):
+    return ExpandField('hour',inp,defaults)
 
-    year = DEFAULT_VALUES['year'][0]
-    expandedMonth = ExpandMonths(record['month'])
-    expandedDoW = ExpandDoW(record['dow'])
+def ExpandMinutes(inp,defaults):
+    return ExpandField('minute',inp,defaults)
 
-    expandedDoM = ExpandDoM(record['dom'])
-    expandedHours = ExpandHour(record['hour'])
-    expandedMins = ExpandMinutes(record['minute'])
+@functools.lru_cache(maxsize=CALENDAR_INDEX_CACHE_SIZE)
+def GetCalendarIndex(year):
+    """CalendarIndex of year, built once per process"""
+    return CalendarIndex(year)
 
-    for month in expandedMonth:
-        """loop through all the days for specified months.
-        if dom/dow is set, then add that datetime()"""
+def GetMatchingDays(masks,year):
+    """ yield (date,domHit,dowHit) for every day of the record's months
+    that is hit by either dom or dow."""
+    index = GetCalendarIndex(year)
+    for month in MaskToValues(masks.month):
+        """ the days of a month hit by dom and by dow are masks from the
+        index, no day of the month is looked at on its own.
 
-        """
         when both dow & dom are populated.
         Its only a "bizarre behavior" -> Paul Vixie says in cron.c code file:
         /* the dom/dow situation is odd.  '* * 1,15 * Sun' will run on the
@@ -278,52 +1079,599 @@ def GetEntryAsTimeStamps(record,tz):
         * like many bizarre things, it's the standard.
         */
         """
-        for d in calendar.Calendar(firstweekday=1).itermonthdates(year,month):
-            if d.month != month: #itermonthdates() returns complete weeks at beg,end
-                continue 
-
-            domHit = dowHit = False
-            try:
-                domHit = True if expandedDoM.index(d.day) >= 0 else False
-            except ValueError:
-                pass
-
-            try:
-                dowHit = True if expandedDoW.index(d.isoweekday()) >= 0 else False
-            except ValueError:
-                pass
+        (domDays,dowDays) = index.GetHitDays(month,masks.dom,masks.dow)
+        for day in MaskToValues(domDays | dowDays):
+            yield (datetime.date(year,month,day),(domDays >> day) & 1 == 1,(dowDays >> day) & 1 == 1)
 
-            if domHit or dowHit:
-                for hr in expandedHours:
-                    for mins in expandedMins:
-                        ts = pytz.datetime.datetime(d.year,d.month,d.day,hr,mins)
-                        cronEntryObj = CronEntry(record,serverTz=tz)
-                        cronEntryObj.ts = ts
-                        cronEntryObj.dowHit = dowHit
-                        cronEntryObj.domHit = domHit
-                        expandedTs.append(cronEntryObj)
+def GetEntryAsTimeStamps(record,tz,defaults):
+    """ given a dict, rep a cron entry.
+    convert in into datetime() - which can be used for tz adjustment
+    this can for some instances generate 60*60*24*31/7 entries, they are
+    yielded one by one in day order, never held in a list"""
+    masks = EntryMasks(record,defaults)
+    year = masks.year
+    expandedHours = MaskToValues(masks.hour)
+    expandedMins = MaskToValues(masks.minute)
+
+    for (d,domHit,dowHit) in GetMatchingDays(masks,year):
+        for hr in expandedHours:
+            for mins in expandedMins:
+                ts = datetime.datetime(d.year,d.month,d.day,hr,mins)
+                cronEntryObj = CronEntry(record,serverTz=tz)
+                cronEntryObj.masks = masks
+                cronEntryObj.ts = ts
+                cronEntryObj.dowHit = dowHit
+                cronEntryObj.domHit = domHit
+                yield cronEntryObj
+
+def GetTzBackendName(name=None):
+    """name, or of the default backend, pytz, or zoneinfo when pytz is not installed"""
+    if name == None:
+        name = 'pytz' if importlib.util.find_spec('pytz') != None else 'zoneinfo'
+
+    return name
+
+@functools.lru_cache(maxsize=None)
+def GetTzBackend(name=None):
+    """TzBackend of name in TZ_BACKENDS, one per process, see GetTzBackendName()"""
+    return TZ_BACKENDS[GetTzBackendName(name)]()
+
+def GetTzPath():
+    """ dirs zoneinfo looks zones up in, as it sets zoneinfo.TZPATH at
+    import, from PYTHONTZPATH or the TZPATH python was built with"""
+    tzPath = os.environ.get('PYTHONTZPATH')
+    if tzPath == None:
+        import sysconfig
+        tzPath = sysconfig.get_config_var('TZPATH') or ''
+
+    return tuple(tzDir for tzDir in tzPath.split(os.pathsep) if os.path.isabs(tzDir))
+
+@functools.lru_cache(maxsize=None)
+def GetTzDataVersion(name=None):
+    """ version of the tz data of TzBackend name, found without importing or
+    loading any of it, so GetRunKey() stays cheap. read once per process.
+    pytz is the version of its installed dist-info, or the mtime of the
+    package without one. zoneinfo and table, of the first dir of GetTzPath(),
+    the version line of its tzdata.zi or its mtime without one, else the
+    version of the tzdata package"""
+    if GetTzBackendName(name) == 'pytz':
+        spec = importlib.util.find_spec('pytz')
+        if spec == None:
+            return 'unknown'
+
+        packageDir = os.path.dirname(spec.origin)
+        for entry in os.listdir(os.path.dirname(packageDir)):
+            match = re.match(r'pytz-([^-]+)\.(dist|egg)-info$',entry)
+            if match:
+                return match.group(1)
+
+        return "mtime {0}".format(os.stat(spec.origin).st_mtime_ns)
+
+    for tzDir in GetTzPath():
+        try:
+            with open(os.path.join(tzDir,'tzdata.zi')) as ziHandle:
+                match = re.match(r'# version (\S+)',ziHandle.readline())
+            if match:
+                return match.group(1)
+        except OSError:
+            pass
 
-    return expandedTs
+        try:
+            return "mtime {0}".format(os.stat(tzDir).st_mtime_ns)
+        except OSError:
+            continue
 
-def AdjustForTz(record,serverTz,jobTz):
-    """given a cron record, adjust for given tz"""
-    expEntryObjs = GetEntryAsTimeStamps(record,serverTz)
+    try:
+        import tzdata
+        return tzdata.IANA_VERSION
+    except ImportError:
+        return 'unknown'
+
+def GetTimeZone(tzName,backend=None):
+    """tzinfo of tzName from backend, a TzBackend, default GetTzBackend()"""
+    return (backend or GetTzBackend()).GetZone(tzName)
+
+def ScanTransitions(getOffset,start,end):
+    """ yield (utcTs,offsetBefore,offsetAfter) of a zone that does not list
+    its changes, between naive utc start and end. getOffset(utcTs) is its
+    utc offset, looked at every ZONE_SCAN_STEP and a change bisected for
+    to the second, utcTs is the first second of the new offset"""
+    oneSecond = datetime.timedelta(seconds=1)
+    ts = start
+    offset = getOffset(ts)
+    while ts < end:
+        nextTs = min(ts + ZONE_SCAN_STEP,end)
+        nextOffset = getOffset(nextTs)
+        if nextOffset != offset:
+            (lo,hi) = (ts,nextTs)
+            while hi - lo > oneSecond:
+                mid = (lo + (hi - lo) // 2).replace(microsecond=0)
+                if getOffset(mid) == offset:
+                    lo = mid
+                else:
+                    hi = mid
+            yield (hi,offset,nextOffset)
+            offset = nextOffset
+        ts = nextTs
+
+@functools.lru_cache(maxsize=ZONE_TABLE_CACHE_SIZE)
+def GetZoneYearTransitions(tzName,year):
+    """ (utcTs,offsetBefore,offsetAfter) of a zoneinfo zone, for changes
+    seen on its wall clock in year. the wall clock offset, fold 0, is looked
+    at every ZONE_SCAN_STEP, cheaper than from utc, and a change bisected
+    for to the second. with fold 0 it changes when the gap or overlap ends,
+    at utcTs + the larger offset"""
+    import zoneinfo
+    zone = zoneinfo.ZoneInfo(tzName)
+    oneSecond = datetime.timedelta(seconds=1)
+    ts = datetime.datetime(year,1,1)
+    yearEnd = datetime.datetime(year+1,1,1)
+    offset = zone.utcoffset(ts)
+
+    transitions = []
+    while ts < yearEnd:
+        nextTs = min(ts + ZONE_SCAN_STEP,yearEnd)
+        nextOffset = zone.utcoffset(nextTs)
+        if nextOffset != offset:
+            (lo,hi) = (ts,nextTs)
+            while hi - lo > oneSecond:
+                mid = (lo + (hi - lo) // 2).replace(microsecond=0)
+                if zone.utcoffset(mid) == offset:
+                    lo = mid
+                else:
+                    hi = mid
+            transitions.append((hi - max(offset,nextOffset),offset,nextOffset))
+            offset = nextOffset
+        ts = nextTs
+
+    return tuple(transitions)
+
+@functools.lru_cache(maxsize=ZONE_TABLE_CACHE_SIZE)
+def GetZoneTable(tzName,year):
+    """ZoneTable of a zoneinfo zone around year, built once per process"""
+    import zoneinfo
+    transitions = []
+    for y in range(year-1,year+2):
+        transitions.extend(GetZoneYearTransitions(tzName,y))
+
+    return ZoneTable(transitions,zoneinfo.ZoneInfo(tzName).utcoffset(datetime.datetime(year-1,1,1)))
+
+def ConvertJobTsToServerTs(ts,jobTz,serverTz,backend=None):
+    """naive job tz datetime to naive server tz datetime, by zone names.
+    to account for dst, always convert tz from utc
+    """
+    backend = backend or GetTzBackend()
+    return backend.GetLocalTs(backend.GetUtcTs(ts,jobTz),serverTz)
+
+def GetOffsetSegments(serverTz,jobTz,year,backend):
+    """ split the job tz wall clock of year into segments where
+    server time - job time stays the same.
+    returns [(segStart,segEnd,delta)], naive job tz datetimes.
+
+    the difference can only change around a transition of either zone.
+    job tz transition at utc t, moves the wall clock from t+before to t+after,
+    gap or overlap lies between those two. server tz transition at utc t
+    is seen at t+offset on job wall clock. so only these points have to be
+    checked, rest of the segment is a plain shift. zones are looked up with
+    backend, a TzBackend."""
+    yearStart = datetime.datetime(year,1,1)
+    yearEnd = datetime.datetime(year+1,1,1)
+    margin = datetime.timedelta(days=2)
+    lo = yearStart - margin
+    hi = yearEnd + margin
+
+    breakPoints = {yearStart,yearEnd}
+    for (utcTs,before,after) in backend.GetTransitions(jobTz,lo,hi):
+        breakPoints.add(utcTs+before)
+        breakPoints.add(utcTs+after)
+
+    jobOffsets = backend.GetOffsets(jobTz,lo,hi)
+    for (utcTs,before,after) in backend.GetTransitions(serverTz,lo,hi):
+        for offset in jobOffsets:
+            breakPoints.add(utcTs+offset)
+
+    points = sorted(p for p in breakPoints if yearStart <= p <= yearEnd)
+    segments = []
+    for (segStart,segEnd) in zip(points,points[1:]):
+        delta = ConvertJobTsToServerTs(segStart,jobTz,serverTz,backend) - segStart
+        if segments and segments[-1][2] == delta:
+            segments[-1] = (segments[-1][0],segEnd,delta)
+        else:
+            segments.append((segStart,segEnd,delta))
+
+    return segments
+
+@functools.lru_cache(maxsize=OFFSET_TABLE_CACHE_SIZE)
+def GetOffsetTable(serverTz,jobTz,year,backend):
+    """ OffsetTable of a zone pair for a year, from TzBackend backend. cached
+    for the process, so all entries of a crontab in the same zone pair pay
+    for it once"""
+    return OffsetTable(GetOffsetSegments(serverTz,jobTz,year,backend))
+
+@functools.lru_cache(maxsize=DST_WINDOW_CACHE_SIZE)
+def GetDstWindows(jobTz,year,backend):
+    """ ((wallStart,wallEnd,isGap),..) the job tz wall clock times of year
+    that dst changes skip, isGap, or repeat. from the zone's transitions in
+    TzBackend backend, a transition at utc t moves the wall clock from
+    t+before to t+after"""
+    yearStart = datetime.datetime(year,1,1)
+    yearEnd = datetime.datetime(year+1,1,1)
+    margin = datetime.timedelta(days=2)
+
+    windows = []
+    for (utcTs,before,after) in backend.GetTransitions(jobTz,yearStart - margin,yearEnd + margin):
+        (wallStart,wallEnd) = (utcTs + min(before,after),utcTs + max(before,after))
+        if wallStart < yearEnd and wallEnd > yearStart:
+            windows.append((wallStart,wallEnd,after > before))
+
+    return tuple(windows)
+
+def GetDstWindowTimes(jobTz,start,end,backend):
+    """ yield (ts,isGap) for every minute of the dst windows of jobTz wall
+    clock start..end, see GetDstWindows()"""
+    oneMinute = datetime.timedelta(minutes=1)
+    for year in range(start.year,end.year+1):
+        for (wallStart,wallEnd,isGap) in GetDstWindows(jobTz,year,backend):
+            ts = wallStart.replace(second=0)
+            if ts < wallStart:
+                ts += oneMinute
+            while ts < wallEnd:
+                if start <= ts < end and ts.year == year:
+                    yield (ts,isGap)
+                ts += oneMinute
+
+@functools.lru_cache(maxsize=DST_WINDOW_CACHE_SIZE)
+def GetDstMinutes(serverTz,jobTz,year,dstPolicy,backend):
+    """ {ts:(delta,..)} job tz wall clock minutes of year that dstPolicy, a
+    DstPolicy, converts other than the offset table does. a skipped gap
+    minute has no delta, an overlap minute run twice has one for each pass.
+    the offset table has the rest, a gap minute shifted and an overlap one
+    run once. the conversion looks these up, not every minute of a day"""
+    if dstPolicy == None:
+        return {}
+
+    dstMinutes = {}
+    for (ts,isGap) in GetDstWindowTimes(jobTz,datetime.datetime(year,1,1),datetime.datetime(year+1,1,1),backend):
+        if isGap and dstPolicy.gap == 'skip':
+            dstMinutes[ts] = ()
+        elif not isGap and dstPolicy.overlap == 'twice':
+            dstMinutes[ts] = tuple(sorted(backend.GetLocalTs(utcTs,serverTz) - ts for utcTs in set(backend.GetUtcTimes(ts,jobTz))))
+
+    return dstMinutes
+
+def IsTimeHit(masks,ts):
+    """EntryMasks fire at job tz wall clock ts"""
+    return ((masks.month >> ts.month) & (masks.hour >> ts.hour) & (masks.minute >> ts.minute) & 1 == 1
+        and ((masks.dom >> ts.day) & 1 == 1 or (masks.dow >> ts.isoweekday()) & 1 == 1))
+
+def GetDstNotes(masks,jobTz,start,end,dstPolicy=None,backend=None):
+    """ a note for each kind of dst window fire times of EntryMasks hit over
+    jobTz wall clock start..end, with what dstPolicy does with them, and
+    the first DST_NOTE_SHOW_TIMES of the times.
+    '3 in a dst gap of Europe/London, moved later by the length of the gap: 2026-03-29 01:00, ..'"""
+    dstPolicy = dstPolicy or DEFAULT_DST_POLICY
+    hits = {True:[],False:[]}
+    for (ts,isGap) in GetDstWindowTimes(jobTz,start,end,backend or GetTzBackend()):
+        if IsTimeHit(masks,ts):
+            hits[isGap].append(ts)
+
+    notes = []
+    for (isGap,what,action) in (
+            (True,'in a dst gap',{'shift':'moved later by the length of the gap','skip':'skipped'}[dstPolicy.gap]),
+            (False,'repeated by a dst change',{'once':'run once, in the second pass','twice':'run in both passes'}[dstPolicy.overlap])):
+        if hits[isGap]:
+            shown = ', '.join("{0:%Y-%m-%d %H:%M}".format(ts) for ts in hits[isGap][:DST_NOTE_SHOW_TIMES])
+            more = ', ..' if len(hits[isGap]) > DST_NOTE_SHOW_TIMES else ''
+            notes.append("{0} {1} of {2}, {3}: {4}{5}".format(len(hits[isGap]),what,jobTz,action,shown,more))
+
+    return notes
+
+def ShiftTimeOfDay(hourMask,minuteMask,delta):
+    """ shift the hour/minute set of a day by delta, with bit shifts.
+    returns [(dayCarry,hourMask,minuteMask)], the shifted set is the
+    union of hourMask x minuteMask of each tuple"""
+    (deltaHours,deltaMins) = divmod(int(delta.total_seconds())//60,60)
+
+    """minutes that stay in the hour and those that wrap into the next"""
+    minuteParts = (
+        (0,(minuteMask << deltaMins) & MINUTE_MASK),
+        (1,minuteMask >> (60-deltaMins)),
+    )
+
+    shifted = []
+    for (hourCarry,mins) in minuteParts:
+        if mins == 0:
+            continue
 
-    adjustedEntries = []
-    utcTzObj = pytz.utc
-    serverTzObj = pytz.timezone(serverTz)
-    jobTzObj = pytz.timezone(jobTz)
+        """hours go into a 5 day window, same day in the middle, so a shift
+        of upto 48hrs either way lands in it"""
+        hours = hourMask << (48+deltaHours+hourCarry)
+        for dayCarry in range(-2,2+1):
+            dayHours = (hours >> ((dayCarry+2)*24)) & HOUR_MASK
+            if dayHours:
+                shifted.append((dayCarry,dayHours,mins))
+
+    return shifted
+
+def GetWindow(now,months):
+    """ (start,end) of a window of months from now's day, naive datetimes.
+    end is on the same day of month, or the last day of a shorter month"""
+    td = now if now != None else datetime.datetime.now()
+    (year,month) = divmod(td.month-1+months,12)
+    (year,month) = (td.year+year,month+1)
+    day = min(td.day,calendar.monthrange(year,month)[1])
+
+    return (datetime.datetime(td.year,td.month,td.day),datetime.datetime(year,month,day))
+
+def GetWindowSegments(serverTz,jobTz,start,end,backend):
+    """ offset segments of a zone pair, GetOffsetSegments(), over job tz wall
+    clock start..end. segments of the years in it are joined and cut to the
+    window, so each one is a period the converted entries stay valid in"""
+    segments = []
+    for year in range(start.year,end.year+1):
+        for (segStart,segEnd,delta) in GetOffsetTable(serverTz,jobTz,year,backend).segments:
+            (segStart,segEnd) = (max(segStart,start),min(segEnd,end))
+            if segStart >= segEnd:
+                continue
+
+            if segments and segments[-1][1] == segStart and segments[-1][2] == delta:
+                segments[-1] = (segments[-1][0],segEnd,delta)
+            else:
+                segments.append((segStart,segEnd,delta))
+
+    return segments
+
+def GetPeriodBlocks(masks,segment,dstMinutes=None):
+    """ like GetAdjustedBlocks(), for the days of a segment from
+    GetWindowSegments(), all shifted by its delta. days cut by the segment
+    start or end keep only the minutes inside it. dstMinutes, from
+    GetDstMinutes(), have their own deltas"""
+    (segStart,segEnd,delta) = segment
+    oneDay = datetime.timedelta(days=1)
+    shiftedDay = None
+    dstMinutes = dstMinutes or {}
+    dstDays = {ts.date() for ts in dstMinutes}
+
+    for year in range(segStart.year,segEnd.year+1):
+        for (d,domHit,dowHit) in GetMatchingDays(masks,year):
+            dayStart = datetime.datetime(d.year,d.month,d.day)
+            if dayStart + oneDay <= segStart:
+                continue
+            elif dayStart >= segEnd:
+                return
+
+            if segStart <= dayStart and dayStart + oneDay <= segEnd and d not in dstDays:
+                if shiftedDay == None:
+                    shiftedDay = ShiftTimeOfDay(masks.hour,masks.minute,delta)
+                shifted = shiftedDay
+            else:
+                shifted = []
+                for hr in MaskToValues(masks.hour):
+                    for mins in MaskToValues(masks.minute):
+                        ts = dayStart.replace(hour=hr,minute=mins)
+                        if segStart <= ts < segEnd:
+                            for minuteDelta in dstMinutes.get(ts,(delta,)):
+                                shifted.extend(ShiftTimeOfDay(1 << hr,1 << mins,minuteDelta))
+
+            for (dayCarry,hourMask,minuteMask) in shifted:
+                yield (d + datetime.timedelta(days=dayCarry),domHit,dowHit,hourMask,minuteMask)
+
+def AdjustForTzInPeriod(masks,segment,dstMinutes=None):
+    """ServerEntry per block of GetPeriodBlocks(), as AdjustForTzAsBlocks()"""
+    for (serverDate,domHit,dowHit,hourMask,minuteMask) in GetPeriodBlocks(masks,segment,dstMinutes):
+        (month,dom,dow) = GetServerDayFields(masks,domHit,dowHit,serverDate)
+        hour = FIELD_STAR if masks.isHourAstreisk else hourMask
+        yield ServerEntry(minuteMask,hour,dom,month,dow,masks.command)
+
+def GetAdjustedBlocks(masks,serverTz,jobTz,year,dstPolicy=None,backend=None):
+    """ tz adjusted times of a record, yields
+    (serverDate,domHit,dowHit,hourMask,minuteMask) in job tz day order.
+
+    job tz calendar is split into segments of constant offset to server tz,
+    see GetOffsetSegments(). days that lie within one segment get their
+    hour/minute set shifted as a whole, so tz conversion happens per
+    transition instead of per fired minute. only the few days that
+    contain a transition are shifted minute by minute. there, minutes of
+    GetDstMinutes() for dstPolicy, a DstPolicy, take their own deltas.
+    zones are looked up with backend, a TzBackend, default GetTzBackend()"""
+    backend = backend or GetTzBackend()
+    offsetTable = GetOffsetTable(serverTz,jobTz,year,backend)
+    segments = offsetTable.segments
+    dstMinutes = GetDstMinutes(serverTz,jobTz,year,dstPolicy,backend)
+    dstDays = {ts.date() for ts in dstMinutes}
+
+    shiftedForDelta = {}
+    oneDay = datetime.timedelta(days=1)
+    segIdx = 0
+
+    for (d,domHit,dowHit) in GetMatchingDays(masks,year):
+        dayStart = datetime.datetime(d.year,d.month,d.day)
+        while segments[segIdx][1] <= dayStart:
+            segIdx+=1
+
+        (segStart,segEnd,delta) = segments[segIdx]
+        if segEnd >= dayStart + oneDay and d not in dstDays:
+            if delta not in shiftedForDelta:
+                shiftedForDelta[delta] = ShiftTimeOfDay(masks.hour,masks.minute,delta)
+            shifted = shiftedForDelta[delta]
+        else:
+            """day has a transition, pick segment of each minute"""
+            shifted = []
+            for hr in MaskToValues(masks.hour):
+                for mins in MaskToValues(masks.minute):
+                    ts = dayStart.replace(hour=hr,minute=mins)
+                    for delta in dstMinutes.get(ts,(offsetTable.GetDelta(ts),)):
+                        shifted.extend(ShiftTimeOfDay(1 << hr,1 << mins,delta))
+
+        for (dayCarry,hourMask,minuteMask) in shifted:
+            serverDate = d + datetime.timedelta(days=dayCarry)
+            yield (serverDate,domHit,dowHit,hourMask,minuteMask)
+
+def AdjustForTz(record,serverTz,jobTz,defaults,backend=None):
+    """given a cron record, adjust for given tz.
+    yields a ServerEntry for every fired minute, same as AdjustForTzPerMinute()"""
+    masks = EntryMasks(record,defaults)
+
+    for (serverDate,domHit,dowHit,hourMask,minuteMask) in GetAdjustedBlocks(masks,serverTz,jobTz,masks.year,None,backend):
+        (month,dom,dow) = GetServerDayFields(masks,domHit,dowHit,serverDate)
+        minutes = MaskToValues(minuteMask)
+        for hr in MaskToValues(hourMask):
+            hour = FIELD_STAR if masks.isHourAstreisk else 1 << hr
+            for mins in minutes:
+                yield ServerEntry(1 << mins,hour,dom,month,dow,masks.command)
+
+def AdjustForTzAsBlocks(record,serverTz,jobTz,defaults,dstPolicy=None,backend=None):
+    """given a cron record, adjust for given tz.
+    yields a ServerEntry per block of GetAdjustedBlocks(), in day order. its
+    hour and minute fields hold all values of the block. input for MergeRuns()"""
+    masks = EntryMasks(record,defaults)
+
+    for (serverDate,domHit,dowHit,hourMask,minuteMask) in GetAdjustedBlocks(masks,serverTz,jobTz,masks.year,dstPolicy,backend):
+        (month,dom,dow) = GetServerDayFields(masks,domHit,dowHit,serverDate)
+        hour = FIELD_STAR if masks.isHourAstreisk else hourMask
+        yield ServerEntry(minuteMask,hour,dom,month,dow,masks.command)
+
+def MaskToBits(mask,size):
+    """bool numpy array, item n set when value n is in mask"""
+    import numpy
+    return numpy.array([(mask >> n) & 1 == 1 for n in range(size)],dtype=bool)
+
+def GetDayColumns(days):
+    """ (year,month,dom,isoweekday) int arrays of a datetime64[D] array, by
+    integer arithmetic on days since 1970-01-01, a thursday"""
+    import numpy
+    months = days.astype('datetime64[M]')
+    monthNos = months.astype(numpy.int64)
+
+    return (monthNos // 12 + 1970,monthNos % 12 + 1,
+            (days - months).astype(numpy.int64) + 1,(days.astype(numpy.int64) + 3) % 7 + 1)
+
+def GetYearDays(year):
+    """datetime64[D] array of the days of year"""
+    import numpy
+    return numpy.arange(numpy.datetime64("{0:04d}-01-01".format(year)),numpy.datetime64("{0:04d}-01-01".format(year+1)),dtype='datetime64[D]')
+
+def GetFireMinutes(masks,year):
+    """ every job tz wall clock minute EntryMasks fire at in year, with
+    numpy. returns (fires,dayIdx,domHits,dowHits), fires a datetime64[m]
+    array in time order, broadcast sums of the matching days and minutes of
+    a day. dayIdx is the day of year of each fire, from 0, as in domHits,dowHits"""
+    import numpy
+    days = GetYearDays(year)
+    (years,months,doms,dows) = GetDayColumns(days)
+    domHits = MaskToBits(masks.dom,32)[doms]
+    dowHits = MaskToBits(masks.dow,8)[dows]
+    dayIdx = numpy.flatnonzero(MaskToBits(masks.month,13)[months] & (domHits | dowHits))
+
+    minutesOfDay = (numpy.array(MaskToValues(masks.hour),dtype=numpy.int64)[:,None]*60 +
+            numpy.array(MaskToValues(masks.minute),dtype=numpy.int64)[None,:]).ravel().astype('timedelta64[m]')
+    fires = (days[dayIdx].astype('datetime64[m]')[:,None] + minutesOfDay[None,:]).ravel()
+
+    return (fires,numpy.repeat(dayIdx,len(minutesOfDay)),domHits,dowHits)
+
+def GetSegmentArrays(serverTz,jobTz,year,backend):
+    """ (starts,ends,deltas) of the offset table segments as numpy arrays.
+    starts and ends are datetime64[m], a minute is in a segment from the
+    first whole minute of its start to the last one of its end. deltas are
+    int minutes"""
+    import numpy
+    segments = GetOffsetTable(serverTz,jobTz,year,backend).segments
+    starts = (numpy.array([seg[0] for seg in segments],dtype='datetime64[s]') + numpy.timedelta64(59,'s')).astype('datetime64[m]')
+    ends = numpy.array([seg[1] for seg in segments],dtype='datetime64[s]').astype('datetime64[m]')
+    deltas = numpy.array([int(seg[2].total_seconds())//60 for seg in segments],dtype=numpy.int64)
+
+    return (starts,ends,deltas)
+
+def GetVectorBlocks(masks,serverTz,jobTz,year,dstPolicy=None,backend=None):
+    """ GetAdjustedBlocks() done with numpy, the same blocks in the same
+    order. fire minutes are an array, see GetFireMinutes(), their deltas
+    searchsorted for in the segment starts and minutes of GetDstMinutes()
+    given their own. server times are broken into day, hour and minute
+    columns with integer arithmetic.
+
+    a day within one segment is grouped as ShiftTimeOfDay() splits it, by
+    minutes that wrap into the next hour and by server day, a group's hours
+    and minutes OR-ed into masks with reduceat. other days, with a
+    transition or dst minutes, give a block per fired minute. a group is a
+    sort key, job day in the high bits"""
+    import numpy
+    (fires,dayIdx,domHits,dowHits) = GetFireMinutes(masks,year)
+    if len(fires) == 0:
+        return
+
+    backend = backend or GetTzBackend()
+    (segStarts,segEnds,segDeltas) = GetSegmentArrays(serverTz,jobTz,year,backend)
+    dayFirsts = GetYearDays(year).astype('datetime64[m]')
+    isWholeDay = segEnds[numpy.searchsorted(segStarts,dayFirsts,side='right')-1] >= dayFirsts + numpy.timedelta64(MINUTES_PER_DAY,'m')
+    dstMinutes = GetDstMinutes(serverTz,jobTz,year,dstPolicy,backend)
+    yearStart = datetime.date(year,1,1)
+    for day in {ts.date() for ts in dstMinutes}:
+        isWholeDay[(day - yearStart).days] = False
+
+    jobMinutes = fires.astype(numpy.int64)
+    serverMinutes = jobMinutes + segDeltas[numpy.searchsorted(segStarts,fires,side='right')-1]
+    """whole days group on (minute wraps,server day - job day), others on (fire idx,pass)"""
+    wraps = (jobMinutes % 60 + (serverMinutes - jobMinutes) % 60) >= 60
+    wholeKeys = wraps*8 + (serverMinutes // MINUTES_PER_DAY - jobMinutes // MINUTES_PER_DAY + 2)
+    groupKeys = (dayIdx << 32) | numpy.where(isWholeDay[dayIdx],wholeKeys,numpy.arange(len(fires))*8)
+
+    if dstMinutes:
+        """a dst minute is replaced by a row per delta it is given, none when skipped"""
+        isDst = numpy.isin(fires,numpy.array(sorted(dstMinutes),dtype='datetime64[m]'))
+        (extraMinutes,extraKeys) = ([],[])
+        for idx in numpy.flatnonzero(isDst).tolist():
+            for (dstPass,delta) in enumerate(dstMinutes[fires[idx].item()]):
+                extraMinutes.append(int(jobMinutes[idx]) + int(delta.total_seconds())//60)
+                extraKeys.append(int(groupKeys[idx]) + dstPass)
+
+        serverMinutes = numpy.concatenate((serverMinutes[~isDst],numpy.array(extraMinutes,dtype=numpy.int64)))
+        groupKeys = numpy.concatenate((groupKeys[~isDst],numpy.array(extraKeys,dtype=numpy.int64)))
+        if len(groupKeys) == 0:
+            return
+
+    order = numpy.argsort(groupKeys,kind='stable')
+    (serverMinutes,groupKeys) = (serverMinutes[order],groupKeys[order])
+
+    one = numpy.uint64(1)
+    hourBits = numpy.left_shift(one,(serverMinutes % MINUTES_PER_DAY // 60).astype(numpy.uint64))
+    minuteBits = numpy.left_shift(one,(serverMinutes % 60).astype(numpy.uint64))
+    groupStarts = numpy.flatnonzero(numpy.concatenate(([True],groupKeys[1:] != groupKeys[:-1])))
+    hourMasks = numpy.bitwise_or.reduceat(hourBits,groupStarts)
+    minuteMasks = numpy.bitwise_or.reduceat(minuteBits,groupStarts)
+    (years,months,doms,dows) = GetDayColumns((serverMinutes[groupStarts] // MINUTES_PER_DAY).astype('datetime64[D]'))
+
+    (domHits,dowHits) = (domHits.tolist(),dowHits.tolist())
+    for (day,y,m,dom,hourMask,minuteMask) in zip((groupKeys[groupStarts] >> 32).tolist(),years.tolist(),months.tolist(),doms.tolist(),
+            hourMasks.tolist(),minuteMasks.tolist()):
+        yield (datetime.date(y,m,dom),domHits[day],dowHits[day],hourMask,minuteMask)
+
+def AdjustForTzVectorized(record,serverTz,jobTz,defaults,dstPolicy=None,backend=None):
+    """ AdjustForTzAsBlocks() with blocks of GetVectorBlocks(), the numpy
+    engine. takes the place of expanding every fired minute as
+    GetEntryAsTimeStamps() and AdjustForTz() do, for entries like * * * * *
+    over a year"""
+    masks = EntryMasks(record,defaults)
+
+    for (serverDate,domHit,dowHit,hourMask,minuteMask) in GetVectorBlocks(masks,serverTz,jobTz,masks.year,dstPolicy,backend):
+        (month,dom,dow) = GetServerDayFields(masks,domHit,dowHit,serverDate)
+        hour = FIELD_STAR if masks.isHourAstreisk else hourMask
+        yield ServerEntry(minuteMask,hour,dom,month,dow,masks.command)
+
+def GetAdjustFunc(engine=None):
+    """ adjust stage of engine, a name of ADJUST_ENGINES, default python.
+    python shifts the hours and minutes of a day as bits, AdjustForTzAsBlocks(),
+    numpy works on arrays of every fired minute, AdjustForTzVectorized().
+    both give the same output, python is faster but for days of transitions"""
+    return AdjustForTzVectorized if engine == 'numpy' else AdjustForTzAsBlocks
+
+def AdjustForTzPerMinute(record,serverTz,jobTz,defaults,backend=None):
+    """given a cron record, adjust for given tz.
+    converts every fired minute on its own, kept as reference for AdjustForTz()"""
+    expEntryObjs = GetEntryAsTimeStamps(record,serverTz,defaults)
 
     for entryObj in expEntryObjs:
-        """to account for dst, always convert tz from utc
-        http://pytz.sourceforge.net/
-        """
-        jobTs = jobTzObj.localize(entryObj.ts)
-        utcTs = jobTs.astimezone(utcTzObj)
-        entryObj.adjustedTs = utcTs.astimezone(serverTzObj)
-        adjustedEntries.append(ReplaceEntryWithServerTs(entryObj))
-
-    return adjustedEntries
+        entryObj.adjustedTs = ConvertJobTsToServerTs(entryObj.ts,jobTz,serverTz,backend)
+        yield ReplaceEntryWithServerTs(entryObj)
 
 def IsEntryNumberAlone(inp):
     pass
@@ -333,43 +1681,38 @@ def ReplaceEntryWithServerTs(entryObj):
     this function generates a tz adjusted cron entry.
     it applies lot of logic on how the out adjusted cron entry should be.
     it can get ugly for dom/dow especially"""
-    retVal = {}
-
-    entry = entryObj.entry
+    masks = entryObj.masks
     serverTs = entryObj.adjustedTs
 
-    retVal['command'] = entry['command']
     """min can't be copied to output as it is. ind-uk tz diff
     is 5.30hrs. so * might move from 30-59 of hour x & 0-29 hour x+1"""
-    retVal['minute'] = str(serverTs.minute)
+    minute = 1 << serverTs.minute
 
-    if REGEX_PATTERNS['astreisk'].match(entry['hour']):
-        retVal['hour'] = '*'
+    if masks.isHourAstreisk:
+        hour = FIELD_STAR
     else:
-        retVal['hour'] = str(serverTs.hour)
+        hour = 1 << serverTs.hour
+
+    (month,dom,dow) = GetServerDayFields(masks,entryObj.domHit,entryObj.dowHit,serverTs)
+
+    return ServerEntry(minute,hour,dom,month,dow,masks.command)
 
-    if REGEX_PATTERNS['astreisk'].match(entry['month']):
-        retVal['month'] = '*'
+def GetServerDayFields(masks,domHit,dowHit,serverTs):
+    """ month,dom,dow masks of a tz adjusted cron entry, for the server date serverTs.
+    domHit,dowHit tell how the job tz day was matched"""
+    if masks.isMonthAstreisk:
+        month = FIELD_STAR
     else:
-        retVal['month'] = str(serverTs.month)
+        month = 1 << serverTs.month
 
-    if entryObj.domHit and entryObj.dowHit:
+    if domHit and dowHit:
         """both dom & dow were configured in cron entry(dow can be from default too)"""
-        retVal['dom'] = str(serverTs.day)
-        if REGEX_PATTERNS['astreisk'].match(entry['dow']):
-            retVal['dow'] = entry['dow']
-        else:
-            retVal['dow'] = str(serverTs.isoweekday())
-    elif entryObj.domHit:
-        retVal['dom'] = str(serverTs.day)
-        #retVal['dow'] = '*'
-        if REGEX_PATTERNS['astreisk'].match(entry['dow']):
-            retVal['dow'] = entry['dow']
-        else:
-            retVal['dow'] = str(serverTs.isoweekday())
-    elif entryObj.dowHit:
-        if REGEX_PATTERNS['astreisk'].match(entry['month']):
-            retVal['dom'] = entry['dom']
+        dom = 1 << serverTs.day
+    elif domHit:
+        dom = 1 << serverTs.day
+    elif dowHit:
+        if masks.isMonthAstreisk:
+            dom = masks.domAsWritten
         else:
             """ for tz shift in mins. wrapping for next month
             * 20 3 30,31 1-7 for London->India 31st becomes first of next month
@@ -379,32 +1722,23 @@ def ReplaceEntryWithServerTs(entryObj):
             00-29 1 4 1 1-7 #31st
             """
 
-            #retVal['dom'] = str(serverTs.day)
-            expandedMonth = ExpandMonths(entry['month'])
-            if serverTs.month in expandedMonth:
-                retVal['dom'] = str(serverTs.day)
+            #dom = 1 << serverTs.day
+            if (masks.month >> serverTs.month) & 1:
+                dom = 1 << serverTs.day
+            elif (masks.month >> (serverTs.month-1)) & 1:
+                """tz adjusted to next month"""
+                dom = 1 << serverTs.day
             else:
-                tzAdjustToNextMonth = False
-                for m in expandedMonth:
-                    if int(serverTs.month) == (m+1):
-                        tzAdjustToNextMonth = True
-                        break
-                    else:
-                        pass
-                if tzAdjustToNextMonth:
-                    retVal['dom'] = str(serverTs.day)
-                else:
-                    retVal['dom'] = entry['dom']
+                dom = masks.domAsWritten
+    else:
+        dom = FIELD_STAR
 
-        if REGEX_PATTERNS['astreisk'].match(entry['dow']):
-            retVal['dow'] = entry['dow']
-        else:
-            retVal['dow'] = str(serverTs.isoweekday())
+    if masks.isDoWAstreisk or not (domHit or dowHit):
+        dow = FIELD_STAR
     else:
-        retVal['dom'] = '*'
-        retVal['dow'] = '*'
+        dow = 1 << serverTs.isoweekday()
 
-    return retVal
+    return (month,dom,dow)
 
 def GetLineAsRecord(line):
     record = {}
@@ -416,81 +1750,55 @@ def GetLineAsRecord(line):
 def PrintLine(line,fileObj=sys.stdout,end="",flush=True):
     print(line,file=fileObj,end=end,flush=flush)
 
+def FormatEntryTimes(job):
+    """time fields of a tz adjusted entry as text"""
+    return ' '.join(MaskToCronText(getattr(job,k)) for k in ENTRY_ORDER[:-1])
+
+def FormatEntry(job):
+    """output line of a tz adjusted entry"""
+    return FormatEntryTimes(job) + ' ' + job.command + " \n"
+
+def FormatTimesAsBlock(line,command,times):
+    """output block of a converted entry line, times from GetEntryTimes()"""
+    block = [line]
+    for entryTimes in times:
+        block.append(entryTimes + ' ' + command + " \n")
+
+    return block
+
+def FormatRecord(record):
+    """output line of a record as parsed, fields as written"""
+    return ' '.join(record[k] for k in ENTRY_ORDER) + " \n"
+
 def PrintEntry(job,fileObj):
-    for k in ENTRY_ORDER:
-        PrintLine(job[k],fileObj=fileObj,end=' ',flush=False)
-
-    PrintLine('',fileObj=fileObj,end="\n")
-
-def GenerateSortKey(entry):
-    """generate custom sort key based on ENTRY_SORT_ORDER"""
-    key = ''
-
-    for x in ENTRY_SORT_ORDER:
-        if entry[x] == '*':
-            key += '01'
-        elif REGEX_PATTERNS['range'].search(entry[x]):
-            key += '99'
-        elif REGEX_PATTERNS['list'].search(entry[x]):
-            key += '99'
-        else:
-            key += "{:02d}".format(int(entry[x]))
-
-    return int(key)
-
-def ConvertAsRangeIfPossible(obj,val):
-    """Used by SqueezeOnField* routines. given a list 1,2,3 convert to 1-3"""
-    if not REGEX_PATTERNS['list'].search(val):
-        return val
-
-    #print(obj.sqzField,val)
-    vals = [int(v) for v in val.split(',')]
-    v1 = vals[0]
-    stepVal = vals[1]-vals[0]
-    iterCount = 1
-    small = large = v1
-    for v in vals[1:]:
-        iterCount+=1
-        if v1+stepVal != v:
-            break
-        else:
-            v1 = v
-        if small > v:
-            small = v
-        if large < v:
-            large = v
-
-    if obj.sqzField == 'dow':
-        v1 = vals[0]
-        if AreDoWValuesInSeq(obj,vals[0],vals[1]):
-            stepVal=1
-        else:
-            stepVal = vals[1]-vals[0]
-        iterCount=1
-        small = large = v1
-        for v in vals[1:]:
-            iterCount+=1
-            if AreDoWValuesInSeq(obj,v1,v):
-                v1 = v
-            else:
-                break
-            if small > v:
-                small = v
-            if large < v:
-                large = v
-
-    if len(vals) == iterCount:
-        if stepVal == 1 or len(vals)==2:
-            return "{0}-{1}".format(small,large)
-        else:
-            return "{0}-{1}/{2}".format(small,large,stepVal)
-    else:
-        return val
+    PrintLine(FormatEntry(job),fileObj=fileObj,flush=False)
+
+def PrintRecord(record,fileObj):
+    """print a record as parsed, fields as written"""
+    PrintLine(FormatRecord(record),fileObj=fileObj,flush=False)
+
+def FieldSortKey(mask):
+    """ sort key of a field mask, below 1 << SORT_KEY_FIELD_BITS.
+    '*' sorts first, then by lowest value. fields with the same lowest value
+    sort by the mask, so a single value comes before ranges and lists starting
+    with it: 5 < 5-6 < 5,7 < 5-7"""
+    if mask == FIELD_STAR:
+        return 0
 
+    return (mask & -mask).bit_length() << 64 | mask
+
+def GenerateSortKey(minute,hour,dom,month,dow):
+    """ sort key of an entry, fields compared in ENTRY_SORT_ORDER. the
+    FieldSortKey() of each is packed into one int, so sorting compares ints"""
+    key = 0
+    for mask in (month,dom,hour,minute,dow):
+        key = key << SORT_KEY_FIELD_BITS | FieldSortKey(mask)
+
+    return key
 
 def EntryFieldsSame(e1,e2,fields):
-    v1=tuple(e1[k] for k in fields)
-    v2=tuple(e2[k] for k in fields)
+    v1=tuple(getattr(e1,k) for k in fields)
+    v2=tuple(getattr(e2,k) for k in fields)
 
     return v1==v2
 
@@ -536,8 +1844,8 @@ def AreHourValuesInSeq(details,curVal,nextVal):
 
 def AreValuesInSeq(details,cur,nxt):
     f = details.sqzField
-    curVal = int(cur[f])
-    nextVal = int(nxt[f])
+    curVal = GetSingleValue(getattr(cur,f))
+    nextVal = GetSingleValue(getattr(nxt,f))
 
     if f == 'dom':
         return AreDoMValuesInSeq(details,curVal,nextVal)
@@ -580,16 +1888,14 @@ def SqueezeOnFieldForTzShiftWithMins(entries,sqzFieldObjs):
             return entries
 
     for entry in entries[0:4]:
-        if REGEX_PATTERNS['range'].search(entry['minute']) or \
-            REGEX_PATTERNS['list'].search(entry['minute']) or \
-                REGEX_PATTERNS['number'].search(entry['minute']):
-                pass
+        if entry.minute != FIELD_STAR:
+            pass
         else:
             return entries
 
     try:
-        if int(cur1['hour'])+1 == int(cur2['hour']) and \
-                int(next1['hour'])+1 == int(next2['hour']):
+        if GetSingleValue(cur1.hour)+1 == GetSingleValue(cur2.hour) and \
+                GetSingleValue(next1.hour)+1 == GetSingleValue(next2.hour):
             pass
         else:
             return entries
@@ -620,8 +1926,8 @@ def SqueezeOnFieldForTzShiftWithMins(entries,sqzFieldObjs):
         return entries
 
     squeezedEntries = []
-    squeeze1 = cur1.copy()
-    squeeze2 = cur2.copy()
+    squeeze1 = cur1
+    squeeze2 = cur2
     lastEntryAccounted = False
     totaEntries=len(entries)
     curIdx = 2
@@ -633,8 +1939,8 @@ def SqueezeOnFieldForTzShiftWithMins(entries,sqzFieldObjs):
         next2= entries[curIdx+1]
 
         try:
-            if int(cur1['hour'])+1 == int(cur2['hour']) and \
-                    int(next1['hour'])+1 == int(next2['hour']):
+            if GetSingleValue(cur1.hour)+1 == GetSingleValue(cur2.hour) and \
+                    GetSingleValue(next1.hour)+1 == GetSingleValue(next2.hour):
                 pass
             else:
                 canSqueeze = False
@@ -644,10 +1950,10 @@ def SqueezeOnFieldForTzShiftWithMins(entries,sqzFieldObjs):
 
         if canSqueeze:
             for sqzField in sqzFields:
-                if REGEX_PATTERNS['is_num_only'].match(cur1[sqzField]) and \
-                    REGEX_PATTERNS['is_num_only'].match(cur2[sqzField]) and \
-                    REGEX_PATTERNS['is_num_only'].match(next1[sqzField]) and \
-                    REGEX_PATTERNS['is_num_only'].match(next2[sqzField]):
+                if IsSingleValue(getattr(cur1,sqzField)) and \
+                    IsSingleValue(getattr(cur2,sqzField)) and \
+                    IsSingleValue(getattr(next1,sqzField)) and \
+                    IsSingleValue(getattr(next2,sqzField)):
                     pass
                 else:
                     canSqueeze = False
@@ -671,9 +1977,8 @@ def SqueezeOnFieldForTzShiftWithMins(entries,sqzFieldObjs):
                     break
 
         if canSqueeze == True:
-            for sqzField in sqzFields:
-                squeeze1[sqzField] += ',' + next1[sqzField]
-                squeeze2[sqzField] += ',' + next2[sqzField]
+            squeeze1 = AppendToFieldList(squeeze1,sqzFields,next1)
+            squeeze2 = AppendToFieldList(squeeze2,sqzFields,next2)
             cur1 = next1
             cur2 = next2
             lastEntryAccounted = True
@@ -683,8 +1988,8 @@ def SqueezeOnFieldForTzShiftWithMins(entries,sqzFieldObjs):
             AppendToSqueezeList(squeezedEntries,sqzFieldObjs,squeeze1,squeeze2)
             cur1 = next1
             cur2 = next2
-            squeeze1 = cur1.copy()
-            squeeze2 = cur2.copy()
+            squeeze1 = cur1
+            squeeze2 = cur2
             curIdx+=2
 
     if lastEntryAccounted:
@@ -695,12 +2000,15 @@ def SqueezeOnFieldForTzShiftWithMins(entries,sqzFieldObjs):
 
     return squeezedEntries
 
+def AppendToFieldList(entry,fields,nxt):
+    """entry with nxt's value of fields added, 1 + 2 -> 1-2"""
+    return entry._replace(**{f: getattr(entry,f) | getattr(nxt,f) for f in fields})
+
 def AppendToSqueezeList(li,sfObjs,s1,s2=None):
+    """squeezed fields are masks already, printed as ranges by MaskToCronText()"""
     for s in (s1,s2):
         if s is None:
             continue
-        for sfObj in sfObjs:
-            s[sfObj.sqzField] = ConvertAsRangeIfPossible(sfObj,s[sfObj.sqzField])
 
         li.append(s)
 
@@ -725,7 +2033,7 @@ def SqueezeOnField(entries,sqzFieldObj):
     prev = entries[0]
     curSeqEntries.append(prev)
 
-    if REGEX_PATTERNS['is_num_only'].match(prev[sqzField]):
+    if IsSingleValue(getattr(prev,sqzField)):
         pass
     else:
         return entries
@@ -733,7 +2041,12 @@ def SqueezeOnField(entries,sqzFieldObj):
     otherFields = ENTRY_TIME_FIELDS.copy()
     otherFields.remove(sqzField)
 
-    stepVal = int(entries[1][sqzField]) - int(entries[0][sqzField])
+    try:
+        stepVal = GetSingleValue(getattr(entries[1],sqzField)) - GetSingleValue(getattr(entries[0],sqzField))
+    except ValueError:
+        """entries[1] is list/range, it can't be squeezed with entries[0].
+        stepVal is set again after it"""
+        stepVal = 1
     totalEntries=len(entries)
     totalEntriesLessOne = totalEntries-1
     curIdx=1
@@ -744,14 +2057,14 @@ def SqueezeOnField(entries,sqzFieldObj):
         lastEntryAccounted = False
         canSqueeze = True
 
-        if REGEX_PATTERNS['is_num_only'].match(prev[sqzField]) and \
-                REGEX_PATTERNS['is_num_only'].match(cur[sqzField]):
+        if IsSingleValue(getattr(prev,sqzField)) and \
+                IsSingleValue(getattr(cur,sqzField)):
             pass
         else:
             canSqueeze = False
 
         if canSqueeze == True:
-            if int(prev[sqzField])+stepVal == int(cur[sqzField]) and \
+            if GetSingleValue(getattr(prev,sqzField))+stepVal == GetSingleValue(getattr(cur,sqzField)) and \
                     EntryFieldsSame(prev,cur,otherFields):
                 pass
             else:
@@ -767,7 +2080,7 @@ def SqueezeOnField(entries,sqzFieldObj):
                 cur contains that isn't part of prev seq"""
                 sqzEntry = curSeqEntries[0]
                 for ent in curSeqEntries[1:]:
-                    sqzEntry[sqzField] += ',' + ent[sqzField]
+                    sqzEntry = AppendToFieldList(sqzEntry,[sqzField],ent)
                 AppendToSqueezeList(squeezedEntries,[sqzFieldObj],sqzEntry)
             elif curSeqCount == 0:
                 """basic validation for sqz failed, sqzField isn't num. maybe list/range"""
@@ -787,9 +2100,9 @@ def SqueezeOnField(entries,sqzFieldObj):
             curSeqEntries.append(cur)
             try:
                 if curIdx < totalEntriesLessOne:
-                    stepVal = int(entries[curIdx+1][sqzField]) - int(entries[curIdx][sqzField])
+                    stepVal = GetSingleValue(getattr(entries[curIdx+1],sqzField)) - GetSingleValue(getattr(entries[curIdx],sqzField))
             except ValueError:
-                """might fail in REGEX_PATTERNS['is_num_only']"""
+                """might fail for list/range"""
                 pass
 
         prev = cur
@@ -799,7 +2112,7 @@ def SqueezeOnField(entries,sqzFieldObj):
         if curSeqCount > 2:
             sqzEntry = curSeqEntries[0]
             for ent in curSeqEntries[1:]:
-                sqzEntry[sqzField] += ',' + ent[sqzField]
+                sqzEntry = AppendToFieldList(sqzEntry,[sqzField],ent)
             AppendToSqueezeList(squeezedEntries,[sqzFieldObj],sqzEntry)
         else:
             for ent in curSeqEntries:
@@ -810,82 +2123,841 @@ def SqueezeOnField(entries,sqzFieldObj):
     return squeezedEntries
                 
 def GetUniqueEntries(entries):
+    """drop duplicate entries, keeping order. linear, a set of seen entries
+    is used instead of searching rest of the list for every entry.
+    as before, the last occurrence of a duplicate is the one kept"""
+    seen = set()
     uniqueEntries = []
-    for idx,rec in enumerate(entries):
-        if rec not in entries[idx+1:]:
+    for rec in reversed(entries):
+        if rec not in seen:
+            seen.add(rec)
             uniqueEntries.append(rec)
 
+    uniqueEntries.reverse()
     return uniqueEntries
 
+def SqueezeEntriesIteratively(entries):
+    """ the sort/unique/SqueezeOnField rounds Main used before CompactEntries().
+    takes AdjustForTz() output, kept to compare against"""
+    entries = list(entries)
+    for x in ([1,2]):
+        for k in SQUEEZE_ORDER:
+            entries.sort(key=SORT_KEY)
+            entriesUnq = GetUniqueEntries(entries)
+            entriesSqz = SqueezeOnField(entriesUnq,SQUEEZE_FILED_OBJS[k])
+            entries    = entriesSqz
+
+
+    ## lets try squeezedEntriesUnique for tz shift with mins, like india-england
+    entries.sort(key=SORT_KEY)
+    entriesUnq = GetUniqueEntries(entries)
+
+    sqzFieldObjs = [SQUEEZE_FILED_OBJS['dom'],SQUEEZE_FILED_OBJS['dow']]
+    return SqueezeOnFieldForTzShiftWithMins(entriesUnq,sqzFieldObjs)
+
+def MergeOnField(entries,field):
+    """ merge entries that differ only in field, OR-ing its masks.
+    such entries fire at the union of their field values. dom/dow are the
+    exception, when both are restricted cron fires on dom OR dow, so there
+    a '*' and a restricted value are never merged"""
+    idx = ServerEntry._fields.index(field)
+    merged = {}
+    for entry in entries:
+        key = entry[:idx] + entry[idx+1:-1]
+        if field == 'dom' or field == 'dow':
+            key = (key,entry[idx] == FIELD_STAR)
+
+        if key in merged:
+            merged[key][1] |= entry[idx]
+        else:
+            merged[key] = [entry,entry[idx]]
+
+    return [entry if entry[idx] == mask else entry._replace(**{field: mask}) for (entry,mask) in merged.values()]
+
+def MergeOnDomDow(entries):
+    """ entries with both dom and dow restricted fire on dom OR dow. if the
+    other fields are same, they merge into one with dom and dow both OR-ed.
+
+    30-59 1 2 3 6
+    30-59 1 3 3 7
+    becomes
+    30-59 1 2-3 3 6-7
+    """
+    merged = {}
+    for entry in entries:
+        if entry.dom == FIELD_STAR or entry.dow == FIELD_STAR:
+            key = entry
+        else:
+            key = (entry.minute,entry.hour,entry.month,entry.command)
+
+        if key in merged:
+            merged[key][1] |= entry.dom
+            merged[key][2] |= entry.dow
+        else:
+            merged[key] = [entry,entry.dom,entry.dow]
+
+    mergedEntries = []
+    for (entry,dom,dow) in merged.values():
+        if entry.dom != dom or entry.dow != dow:
+            entry = entry._replace(dom=dom,dow=dow)
+        mergedEntries.append(entry)
+
+    return mergedEntries
+
+def MergeRuns(entries):
+    """ streaming run-length merge of entries in day order, from
+    AdjustForTzAsBlocks(). an entry that differs from the one before only in
+    one field is merged into it, as MergeOnField() would, days in a row or
+    same week day of weeks in a row become one entry. only the entry being
+    merged into is held, so memory grows with the merged entries yielded,
+    not with the days or minutes fired"""
+    prev = None
+    for entry in entries:
+        if prev != None:
+            diffIdx = -1
+            for idx in range(len(ENTRY_TIME_FIELDS)): ## time fields come first in ServerEntry
+                if prev[idx] != entry[idx]:
+                    if diffIdx != -1:
+                        diffIdx = -1
+                        break
+                    diffIdx = idx
+
+            if diffIdx != -1 and prev.command == entry.command and \
+                    prev[diffIdx] != FIELD_STAR and entry[diffIdx] != FIELD_STAR:
+                prev = prev._replace(**{ServerEntry._fields[diffIdx]: prev[diffIdx] | entry[diffIdx]})
+                continue
+
+            yield prev
+
+        prev = entry
+
+    if prev != None:
+        yield prev
+
+def IsEntryCovered(entry,other):
+    """ True if other fires at every minute entry fires. each field of entry
+    within other's, and dom/dow '*' the same in both, as restricted dom/dow
+    fire on dom OR dow. other with both '*' fires every day"""
+    for idx in range(len(ENTRY_TIME_FIELDS)): ## time fields come first in ServerEntry
+        if entry[idx] & ~other[idx]:
+            return False
+
+    if other.dom == FIELD_STAR and other.dow == FIELD_STAR:
+        return True
+
+    return (entry.dom == FIELD_STAR) == (other.dom == FIELD_STAR) and \
+            (entry.dow == FIELD_STAR) == (other.dow == FIELD_STAR)
+
+def GetEntrySize(entry):
+    """ bits set in the time fields of an entry, '*' above any full field.
+    an entry covering another, IsEntryCovered(), is larger unless the same"""
+    return sum(MINUTE_MASK.bit_length()+1 if entry[idx] == FIELD_STAR else bin(entry[idx]).count('1') for idx in range(len(ENTRY_TIME_FIELDS)))
+
+def DropCoveredEntries(entries):
+    """ drop entries another entry already fires for. merges in a different
+    order can leave such a one, 30-59 * * * 2 next to 0-59 * * * 1-7.
+    entries are unique, as CompactEntries() gives them. taken largest first,
+    an entry is checked against the kept ones only, covering is transitive,
+    so it costs entries x kept entries, not entries squared"""
+    keptEntries = []
+    for entry in sorted(entries,key=GetEntrySize,reverse=True):
+        if not any(other.command == entry.command and IsEntryCovered(entry,other) for other in keptEntries):
+            keptEntries.append(entry)
+
+    return keptEntries
+
+def CompactEntries(entries,stats=None):
+    """ squeeze tz adjusted entries into as few cron lines as possible.
+    entries are merged on each field of SQUEEZE_ORDER and then on dom+dow.
+    this is repeated till a round merges nothing, so the result is a fixed
+    point: compacting it again gives it back. each round is linear, no sort
+    is needed as entries are grouped by the fields that must be same.
+    entries may be any iterable, like MergeRuns() output, but are taken
+    into a list, the rounds go over it till the fixed point. memory is
+    linear in the entries given, time linear per round, plus entries x
+    kept entries for DropCoveredEntries(). stats is an EntryStats, every
+    merge of every round is a stage in it"""
+    entries = RunStage(stats,'dedup',lambda entries: list(dict.fromkeys(entries)),entries)
+    while True:
+        count = len(entries)
+        for k in SQUEEZE_ORDER:
+            entries = RunStage(stats,'merge_'+k,MergeOnField,entries,k)
+        entries = RunStage(stats,'merge_dom_dow',MergeOnDomDow,entries)
+
+        if len(entries) == count:
+            break
+
+    entries = RunStage(stats,'drop_covered',DropCoveredEntries,entries)
+    return RunStage(stats,'sort',lambda entries: sorted(entries,key=SORT_KEY),entries)
+
 def PrintEntriesForDebug(entries,msg=''):
     for x in entries:
-        print("{msg}<>{month}.{dom}.{hour}.{minute}.{dow}".format(msg=msg,**x))
+        print("{msg}<>{month}.{dom}.{hour}.{minute}.{dow}".format(msg=msg,**{k: MaskToCronText(v) for (k,v) in zip(ENTRY_ORDER[:-1],x)}))
 
-def Main(inFile,outFile=None):
-    if outFile == None:
-        outHand=sys.stdout
-    else:
-        outHand=open(outFile,'w')
+def ConvertLine(line,serverTz,jobTz,isEntry,defaults,backend=None):
+    """ output block of a line from CronTzConverter.GetLineTasks().
+    module level, so it can be sent to a process pool"""
+    if not isEntry:
+        return [line]
 
-    SetWeekDayShortNames()
-    SetMonthShortNames()
-    SetSqueezeFieldObjects()
-    with open(inFile) as cronFileHandle:
-        serverTz = ''
-        jobTz = ''
-        isJobTzSet = False
-        for line in cronFileHandle:
-            SetDefaultValues()
-            if REGEX_PATTERNS['job_tz'].match(line):
-                jobTz = line.split('=')[1].strip()
-                isJobTzSet = True
-    
-            if REGEX_PATTERNS['server_tz'].match(line):
-                serverTz = line.split('=')[1].strip()
-                PrintLine(line,fileObj=outHand)
-            elif REGEX_PATTERNS['comment'].match(line):
-                PrintLine(line,fileObj=outHand)
-            elif REGEX_PATTERNS['blank_line'].match(line):
-                PrintLine(line,fileObj=outHand)
-            elif REGEX_PATTERNS['variable'].match(line):
-                PrintLine(line,fileObj=outHand)
-            else:
-                entryAsRecord = GetLineAsRecord(line)
-                SetDefaultValuesDomDow(entryAsRecord)
-                PrintLine(line,fileObj=outHand)
+    entryAsRecord = GetLineAsRecord(line)
+    if jobTz == None:
+        return [line,FormatRecord(entryAsRecord)]
 
-                if isJobTzSet:
-                    #tzAdjustedEntryUnique = list(map(dict, frozenset(frozenset(tuple(e.items()) for e in tzAdjustedEntry))))
-                    adjEntries = AdjustForTz(entryAsRecord,serverTz,jobTz)
+    return FormatTimesAsBlock(line,entryAsRecord['command'],GetEntryTimes(entryAsRecord,serverTz,jobTz,defaults,None,None,backend))
 
-                    #PrintEntriesForDebug(adjEntries,"AdjustedEntry")
-                    for x in ([1,2]):
-                        for k in SQUEEZE_ORDER:
-                            adjEntries.sort(key=GenerateSortKey)
-                            adjEntriesUnq = GetUniqueEntries(adjEntries)
-                            adjEntriesSqz = SqueezeOnField(adjEntriesUnq,SQUEEZE_FILED_OBJS[k])
-                            adjEntries    = adjEntriesSqz
+def RunStage(stats,stage,func,entries,*args):
+    """ func(entries,*args) of a conversion stage. timed into stats, an
+    EntryStats, if given, else just called, generators stay streamed"""
+    if stats == None:
+        return func(entries,*args)
+    else:
+        return stats.Run(stage,func,entries,*args)
+
+def GetEntryTimes(record,serverTz,jobTz,defaults,stats=None,dstPolicy=None,backend=None,engine=None):
+    """ time fields, as text, of the lines a record is converted to.
+    stats is an EntryStats to time the stages into. dstPolicy a DstPolicy,
+    backend the TzBackend zones are looked up with, engine the adjust
+    engine, see GetAdjustFunc().
+    module level, so it can be sent to a process pool"""
+    adjEntries = RunStage(stats,'adjust',GetAdjustFunc(engine),record,serverTz,jobTz,defaults,dstPolicy,backend)
+    adjEntries = RunStage(stats,'merge_runs',MergeRuns,adjEntries)
+    adjEntries = CompactEntries(adjEntries,stats)
+
+    return RunStage(stats,'format',lambda entries: [FormatEntryTimes(entry) for entry in entries],adjEntries)
+
+def GetWindowBlock(line,record,serverTz,jobTz,defaults,window,stats=None,dstPolicy=None,backend=None):
+    """ output block of an entry converted over window, (start,end) from
+    GetWindow(). a '*' month is every month of the window, not just this one.
+    a sub block is written for each period of constant offset, headed by a
+    comment with its validity, job tz wall clock. lines of the first period
+    are the ones in effect, those of later periods are commented out. the
+    crontab has to be converted again when the first period ends.
+
+    * 20 * * 1 cmd
+    # VALID_FROM=2026-10-16 00:00 VALID_TO=2026-10-25 01:00 JOB_TZ=Europe/London
+    30-59 0 * * 2 cmd
+    0-29 1 * * 2 cmd
+    # VALID_FROM=2026-10-25 01:00 VALID_TO=2027-03-28 01:00 JOB_TZ=Europe/London
+    #30-59 1 * * 2 cmd
+    #0-29 2 * * 2 cmd
+    stats, dstPolicy and backend as GetEntryTimes().
+    module level, so it can be sent to a process pool"""
+    backend = backend or GetTzBackend()
+    masks = EntryMasks(record,defaults._replace(month=MONTH_MASK))
+    dstMinutes = {}
+    for year in range(window[0].year,window[1].year+1):
+        dstMinutes.update(GetDstMinutes(serverTz,jobTz,year,dstPolicy,backend))
+
+    block = [line]
+    for (idx,segment) in enumerate(GetWindowSegments(serverTz,jobTz,window[0],window[1],backend)):
+        block.append("# VALID_FROM={0:%Y-%m-%d %H:%M} VALID_TO={1:%Y-%m-%d %H:%M} JOB_TZ={2}\n".format(segment[0],segment[1],jobTz))
+        adjEntries = RunStage(stats,'adjust',AdjustForTzInPeriod,masks,segment,dstMinutes)
+        adjEntries = RunStage(stats,'merge_runs',MergeRuns,adjEntries)
+        for entry in CompactEntries(adjEntries,stats):
+            block.append(('' if idx == 0 else '#') + FormatEntry(entry))
+
+    return block
+
+@functools.lru_cache(maxsize=FIRE_SCHEDULE_CACHE_SIZE)
+def GetFireSchedule(minute,hour,dom,month,dow,jobTz):
+    """FireSchedule for time fields as written, built once per process"""
+    return FireSchedule({'minute':minute,'hour':hour,'dom':dom,'month':month,'dow':dow,'command':''},jobTz)
+
+def GetFireTimes(schedule,start,serverTz=None,backend=None):
+    """ yield (utcTs,serverTs) of a FireSchedule from start, an aware datetime,
+    on. job tz times are taken to utc by the offset table of utc to job tz,
+    as entries are converted, so a time in a dst gap is moved later by the
+    length of the gap and one in an overlap fires once. that can put a time
+    up to the dst shift before the one ahead of it, so the search starts FIRE_REORDER_WINDOW early and
+    times are held that long to yield them in order, once each.
+    serverTs is None without serverTz. zones are looked up with backend, a
+    TzBackend, default GetTzBackend()"""
+    backend = backend or GetTzBackend()
+    startUtc = start.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    localStart = backend.GetLocalTs(startUtc,schedule.jobTz)
+    serverTzObj = GetTimeZone(serverTz,backend) if serverTz else None
+
+    held = []
+    lastUtc = None
+    for ts in itertools.chain(schedule.GetLocalTimes(localStart - FIRE_REORDER_WINDOW),[None]):
+        if ts != None:
+            utcTs = ts + GetOffsetTable('UTC',schedule.jobTz,ts.year,backend).GetDelta(ts)
+            if utcTs >= startUtc:
+                heapq.heappush(held,utcTs)
+
+        while held and (ts == None or held[0] <= utcTs - FIRE_REORDER_WINDOW):
+            firedTs = heapq.heappop(held)
+            if firedTs != lastUtc:
+                lastUtc = firedTs
+                firedTs = firedTs.replace(tzinfo=datetime.timezone.utc)
+                yield (firedTs,firedTs.astimezone(serverTzObj) if serverTzObj != None else None)
+
+def GetNextFireTimes(record,jobTz,start=None,count=1,serverTz=None,backend=None):
+    """ next count fire times of a cron record in jobTz from start, an aware
+    datetime, naive is utc, now if not given. returns [(utcTs,serverTs)], see
+    GetFireTimes(). fewer when the entry stops firing"""
+    if start == None:
+        start = datetime.datetime.now(datetime.timezone.utc)
+    if start.tzinfo == None:
+        start = start.replace(tzinfo=datetime.timezone.utc)
+
+    schedule = GetFireSchedule(record['minute'],record['hour'],record['dom'],record['month'],record['dow'],jobTz)
+    return list(itertools.islice(GetFireTimes(schedule,start,serverTz,backend),count))
+
+def GetUtcTs(ts,tz,backend=None):
+    """naive tz wall clock ts to naive utc, dst resolved as entries are converted"""
+    return ts + GetOffsetTable('UTC',tz,ts.year,backend or GetTzBackend()).GetDelta(ts)
+
+def GetPeriodEndUtcTs(validTo,tz,backend=None):
+    """ utc end of a period, after its last minute. not GetUtcTs(validTo),
+    a period ending in a dst gap has minutes that are later in utc"""
+    oneMinute = datetime.timedelta(minutes=1)
+    return GetUtcTs(validTo - oneMinute,tz,backend) + oneMinute
+
+def GetMinutes(td):
+    """whole minutes of a timedelta"""
+    return int(td.total_seconds()) // 60
+
+def OrFireBits(bits,at,piece):
+    """ or bytes of piece into bits from at on, cut to bits. plain copy where
+    bits are still clear, pieces of a day overlap only in a dst gap"""
+    lo = max(0,-at)
+    hi = min(len(piece),len(bits)-at)
+    if lo >= hi:
+        return
+
+    target = bits[at+lo:at+hi]
+    if 1 in target:
+        bits[at+lo:at+hi] = bytes(x | y for (x,y) in zip(target,piece[lo:hi]))
+    else:
+        bits[at+lo:at+hi] = piece[lo:hi]
+
+def GetFireBits(masks,tz,start,end,backend=None):
+    """ fires of EntryMasks in tz over naive utc start..end, as a bytearray of
+    a byte per minute, 1 when it fires. a day's minutes are laid down at once,
+    split only where the utc offset changes in the day. backend as GetFireTimes()"""
+    backend = backend or GetTzBackend()
+    bits = bytearray(GetMinutes(end - start))
+    dayPattern = bytearray(24*60)
+    for hr in MaskToValues(masks.hour & HOUR_MASK):
+        for mins in MaskToValues(masks.minute & MINUTE_MASK):
+            dayPattern[hr*60+mins] = 1
+
+    oneDay = datetime.timedelta(days=1)
+    d = backend.GetLocalTs(start,tz).date() - oneDay
+    lastDay = backend.GetLocalTs(end,tz).date() + oneDay
+    while d <= lastDay:
+        if (masks.month >> d.month) & 1 == 1 and ((masks.dom >> d.day) & 1 == 1 or (masks.dow >> d.isoweekday()) & 1 == 1):
+            dayStart = datetime.datetime(d.year,d.month,d.day)
+            offsetTable = GetOffsetTable('UTC',tz,d.year,backend)
+            idx = offsetTable.GetSegmentIndex(dayStart)
+            pieceStart = dayStart
+            while pieceStart < dayStart + oneDay:
+                (segStart,segEnd,delta) = offsetTable.segments[idx]
+                pieceEnd = min(segEnd,dayStart + oneDay)
+                (a,b) = (GetMinutes(pieceStart - dayStart),GetMinutes(pieceEnd - dayStart))
+                OrFireBits(bits,GetMinutes(pieceStart + delta - start),dayPattern[a:b])
+                (pieceStart,idx) = (pieceEnd,idx+1)
+        d += oneDay
+
+    return bits
+
+def GetBitsTimes(bits,start,count):
+    """utc times of the first count set bytes of GetFireBits() bits"""
+    times = []
+    at = bits.find(1)
+    while at != -1 and len(times) < count:
+        times.append(start + datetime.timedelta(minutes=at))
+        at = bits.find(1,at+1)
+
+    return times
+
+def VerifyEntry(record,jobTz,serverTz,periods,defaults,backend=None):
+    """ compare fires of a JOB_TZ record with those of the lines it was
+    converted to. periods are [(validFrom,validTo,records)], job tz wall
+    clock, converted records in effect from validFrom to validTo. both are
+    laid out over the periods, as GetFireBits(), and compared at once as
+    ints. returns (fires,missing,extra), missing and extra are bytearrays
+    of the same layout. starts at utc of periods[0][0]"""
+    allMonths = defaults._replace(month=MONTH_MASK)
+    start = GetUtcTs(periods[0][0],jobTz,backend)
+    end = GetPeriodEndUtcTs(periods[-1][1],jobTz,backend)
+    origBits = GetFireBits(EntryMasks(record,allMonths),jobTz,start,end,backend)
+
+    conv = 0
+    for (validFrom,validTo,records) in periods:
+        (periodStart,periodEnd) = (GetUtcTs(validFrom,jobTz,backend),GetPeriodEndUtcTs(validTo,jobTz,backend))
+        at = GetMinutes(periodStart - start)
+        for convRecord in records:
+            periodBits = GetFireBits(EntryMasks(convRecord,allMonths),serverTz,periodStart,periodEnd,backend)
+            conv |= int.from_bytes(periodBits,'little') << 8*at
+
+    orig = int.from_bytes(origBits,'little')
+    diff = orig ^ conv
+    return (origBits.count(1),
+            bytearray((diff & orig).to_bytes(len(origBits),'little')),
+            bytearray((diff & ~orig).to_bytes(len(origBits),'little')))
+
+def GetVerifyGroups(inLines,outLines,defaults):
+    """ yield (line,record,serverTz,jobTz,periods) for every JOB_TZ entry of
+    a crontab, periods as VerifyEntry() takes, read from the converted
+    output. output is walked along the input, every input line is followed
+    by the lines it was converted to. without VALID_FROM comments of
+    --window-months, lines are in effect for the default month, a whole year
+    with months in the entry"""
+    tasks = list(CronTzConverter().GetLineTasks(inLines))
+    outIdx = 0
+    for (taskIdx,(line,serverTz,jobTz,isEntry)) in enumerate(tasks):
+        if outIdx >= len(outLines) or outLines[outIdx] != line:
+            raise OutputMismatchError("input line {0} not in output: {1}".format(taskIdx+1,line.rstrip('\n')))
+        outIdx += 1
+
+        nextLine = tasks[taskIdx+1][0] if taskIdx+1 < len(tasks) else None
+        converted = []
+        while outIdx < len(outLines) and outLines[outIdx] != nextLine:
+            converted.append(outLines[outIdx])
+            outIdx += 1
+        if jobTz == None:
+            continue
 
+        record = GetLineAsRecord(line)
+        if converted and REGEX_PATTERNS['valid_period'].match(converted[0]):
+            periods = []
+            for outLine in converted:
+                period = REGEX_PATTERNS['valid_period'].match(outLine)
+                if period:
+                    (validFrom,validTo) = (datetime.datetime.strptime(ts,'%Y-%m-%d %H:%M') for ts in period.groups())
+                    periods.append((validFrom,validTo,[]))
+                elif not REGEX_PATTERNS['blank_line'].match(outLine):
+                    """later periods are commented out"""
+                    periods[-1][2].append(GetLineAsRecord(re.sub('^\s*#','',outLine)))
+        else:
+            month = GetSingleValue(defaults.month)
+            if EntryMasks(record,defaults).isMonthAstreisk:
+                (year,nextMonth) = divmod(defaults.year*12+month,12)
+                (validFrom,validTo) = (datetime.datetime(defaults.year,month,1),datetime.datetime(year,nextMonth+1,1))
+            else:
+                (validFrom,validTo) = (datetime.datetime(defaults.year,1,1),datetime.datetime(defaults.year+1,1,1))
+            records = [GetLineAsRecord(outLine) for outLine in converted if not (REGEX_PATTERNS['comment'].match(outLine) or REGEX_PATTERNS['blank_line'].match(outLine))]
+            periods = [(validFrom,validTo,records)]
+
+        yield (line,record,serverTz,jobTz,periods)
+
+def GetEntryCacheKey(masks,serverTz,jobTz,dstPolicy=None,backend=None):
+    """ EntryCache key of an entry. everything its conversion depends on,
+    fields as parsed masks so 1-3 and 1,2,3 share a key. backends may carry
+    different tz data, so the tz backend and its data version are a part
+    too, a tz database update makes new keys"""
+    dstPolicy = dstPolicy or DEFAULT_DST_POLICY
+    backend = backend or GetTzBackend()
+    fields = (masks.minute,masks.hour,masks.dom,masks.month,masks.dow,masks.domAsWritten,
+            masks.isHourAstreisk,masks.isMonthAstreisk,masks.isDoWAstreisk)
+
+    return "{0}|{1} {2}|{3},{4}|{5}|{6}|{7}|{8}".format(ENTRY_CACHE_VERSION,backend.name,backend.version,dstPolicy.gap,dstPolicy.overlap,serverTz,jobTz,masks.year,
+            ' '.join("{0:x}".format(f) for f in fields))
+
+def ConvertCrontab(crontab,now=None,executor=None,cache=None,windowMonths=None,stats=None,dstPolicy=None,noteFile=None,tzBackend=None,engine=None):
+    """ crontab, a string or lines, converted. returns output lines.
+    stats is a ConversionStats to time every JOB_TZ entry into.
+    dstPolicy, noteFile, tzBackend and engine as of CronTzConverter"""
+    return CronTzConverter(now,cache=cache,windowMonths=windowMonths,stats=stats,dstPolicy=dstPolicy,noteFile=noteFile,tzBackend=tzBackend,engine=engine).Convert(crontab,executor=executor)
+
+def OpenEntryCache(cacheFile,maxEntries=ENTRY_CACHE_MAX_ENTRIES):
+    """EntryCache of cacheFile, None when no cacheFile"""
+    if cacheFile == None:
+        return None
+    else:
+        return EntryCache(cacheFile,maxEntries=maxEntries)
+
+def GetExecutor(jobs):
+    """ process pool of jobs workers, None to convert in this process.
+    tz backend and adjust engine are sent with every entry"""
+    if jobs > 1:
+        import concurrent.futures
+        return concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+    else:
+        return None
+
+def GetBatchInputFiles(paths):
+    """ files to convert for paths, files or dirs like /etc/cron.d.
+    files of a dir are taken in name order, hidden ones skipped, not recursive"""
+    inFiles = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                inFile = os.path.join(path,name)
+                if not name.startswith('.') and os.path.isfile(inFile):
+                    inFiles.append(inFile)
+        else:
+            inFiles.append(path)
+
+    """a file given twice, or as a file and in its dir, is converted once"""
+    uniqueFiles = {}
+    for inFile in inFiles:
+        uniqueFiles.setdefault(os.path.abspath(inFile),inFile)
+
+    return list(uniqueFiles.values())
+
+def GetContentHash(crontab,defaults,window=None,dstPolicy=None,backend=None):
+    """ hash of a crontab and the defaults, window, tz backend with its data
+    version and dst policy it is converted with. default month and year, or
+    a tz database update, change the output of same content"""
+    import hashlib
+    backend = backend or GetTzBackend()
+    digest = hashlib.sha256()
+    digest.update("{0} {1} {2} {3} {4} {5}\n".format(defaults.year,defaults.month,window,backend.name,backend.version,tuple(dstPolicy or DEFAULT_DST_POLICY)).encode())
+    digest.update(crontab.encode())
+
+    return digest.hexdigest()
+
+def LoadBatchState(stateFile):
+    """ {inFile: state} of last run, empty if there was none. inFile is an
+    abspath, state the content hash of a --batch run, or run key and output
+    stamp of a single file, see SaveRunState()"""
+    import json
+    try:
+        with open(stateFile) as stateHandle:
+            return json.load(stateHandle)
+    except (FileNotFoundError,ValueError):
+        return {}
+
+def SaveBatchState(stateFile,state):
+    import json
+    with OutputWriter(stateFile,atomic=True) as stateWriter:
+        stateWriter.Write(json.dumps(state,indent=1,sort_keys=True))
+
+def ConvertFiles(paths,outDir,stateFile=None,atomic=False,jobs=1,cache=None,windowMonths=None,stats=None,dstPolicy=None,noteFile=None,tzBackend=None,engine=None):
+    """ convert files, or files of dirs, into outDir, same name as input.
+    one process for all, caches of tz and offset tables are shared. a file
+    is skipped when its content hash is same as in stateFile from the last
+    run and its output is there. returns (converted,skipped) inFiles.
+    cache is an EntryCache, dstPolicy, noteFile, tzBackend and engine as of
+    CronTzConverter"""
+    if stateFile == None:
+        stateFile = os.path.join(outDir,BATCH_STATE_FILE)
+
+    inFiles = GetBatchInputFiles(paths)
+    outFiles = {}
+    for inFile in inFiles:
+        outFile = os.path.join(outDir,os.path.basename(inFile))
+        if outFile in outFiles.values():
+            raise ValueError("{0} and another input are both written to {1}".format(inFile,outFile))
+        outFiles[inFile] = outFile
+
+    os.makedirs(outDir,exist_ok=True)
+    lastState = LoadBatchState(stateFile)
+    state = {}
+    converted = []
+    skipped = []
+
+    converter = CronTzConverter(cache=cache,windowMonths=windowMonths,stats=stats,dstPolicy=dstPolicy,noteFile=noteFile,tzBackend=tzBackend,engine=engine)
+    executor = GetExecutor(jobs)
+    try:
+        for inFile in inFiles:
+            with open(inFile) as cronFileHandle:
+                crontab = cronFileHandle.read()
+
+            key = os.path.abspath(inFile)
+            contentHash = GetContentHash(crontab,converter.defaults,converter.window,dstPolicy,converter.backend)
+            if lastState.get(key) == contentHash and os.path.exists(outFiles[inFile]):
+                state[key] = contentHash
+                skipped.append(inFile)
+                continue
+
+            with OutputWriter(outFiles[inFile],atomic=atomic) as outWriter:
+                for block in converter.ConvertBlocks(io.StringIO(crontab),executor=executor):
+                    outWriter.Write(''.join(block))
+
+            state[key] = contentHash
+            converted.append(inFile)
+    finally:
+        if executor != None:
+            executor.shutdown()
+
+        SaveBatchState(stateFile,state)
+
+    return (converted,skipped)
+
+def ConvertWithMemo(converter,lines,memo,executor=None):
+    """ output blocks of lines. memo is {task: block} of the last version,
+    see GetLineTasks(), blocks of tasks in it are reused, only new or edited
+    lines are converted. returns (blocks,memo of this version,converted count)"""
+    tasks = list(converter.GetLineTasks(lines))
+    started = []
+    converted = 0
+    for task in tasks:
+        if task in memo:
+            started.append(memo[task])
+        else:
+            (line,serverTz,jobTz,isEntry) = task
+            started.append(converter.StartBlock(line,serverTz,jobTz,isEntry,executor))
+            converted += 1 if jobTz != None else 0
 
-                    ## lets try squeezedEntriesUnique for tz shift with mins, like india-england
-                    adjEntries.sort(key=GenerateSortKey)
-                    adjEntriesUnq = GetUniqueEntries(adjEntries)
+    blocks = [converter.FinishBlock(block) for block in started]
+    if converter.cache != None:
+        converter.cache.Commit()
 
-                    sqzFieldObjs = [SQUEEZE_FILED_OBJS['dom'],SQUEEZE_FILED_OBJS['dow']]
-                    adjEntries = SqueezeOnFieldForTzShiftWithMins(adjEntriesUnq,sqzFieldObjs)
+    return (blocks,dict(zip(tasks,blocks)),converted)
 
-                    for entry in adjEntries:
-                        PrintEntry(entry,fileObj=outHand)
+def GetFileStamp(path):
+    """changes when path is written or replaced, None if it isn't there"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    return (st.st_mtime_ns,st.st_size,st.st_ino)
+
+def WatchFile(inFile,outFile,interval=WATCH_INTERVAL,jobs=1,cache=None,stopEvent=None,windowMonths=None,dstPolicy=None,noteFile=None,tzBackend=None,engine=None):
+    """ convert inFile to outFile, and again every time inFile changes, till
+    stopEvent, a threading.Event, is set. inFile is polled every interval
+    secs. entries not changed since last version are taken from memory,
+    outFile is always replaced atomically. everything is converted again
+    when defaults or the window change, a new month or day. dst notes are
+    written for converted entries only. a version that fails to convert,
+    like one with an unknown zone, is reported on stderr and outFile and
+    memory are kept as they were till inFile changes again. one that can't
+    be read, removed or replaced mid-read, is tried again next poll"""
+    if stopEvent == None:
+        stopEvent = threading.Event()
+
+    memo = {}
+    lastStamp = None
+    lastDefaults = None
+    executor = GetExecutor(jobs)
+    try:
+        while not stopEvent.is_set():
+            stamp = GetFileStamp(inFile)
+            converter = CronTzConverter(cache=cache,windowMonths=windowMonths,dstPolicy=dstPolicy,noteFile=noteFile,tzBackend=tzBackend,engine=engine)
+            if (converter.defaults,converter.window) != lastDefaults:
+                memo = {}
 
-                    isJobTzSet = False
+            if stamp != None and (stamp != lastStamp or (converter.defaults,converter.window) != lastDefaults):
+                try:
+                    with open(inFile) as cronFileHandle:
+                        (blocks,newMemo,converted) = ConvertWithMemo(converter,cronFileHandle,memo,executor=executor)
+
+                    with OutputWriter(outFile,atomic=True) as outWriter:
+                        for block in blocks:
+                            outWriter.Write(''.join(block))
+                except OSError as err:
+                    print("{0}: not converted, {1}, trying again".format(inFile,err),file=sys.stderr)
+                except Exception as err:
+                    print("{0}: not converted, {1!r}, {2} kept till {0} changes".format(inFile,err,outFile),file=sys.stderr)
+                    lastStamp = stamp
+                    lastDefaults = (converter.defaults,converter.window)
                 else:
-                    PrintEntry(entryAsRecord,fileObj=outHand)
+                    print("{0}: converted {1} entries".format(inFile,converted),file=sys.stderr)
+                    memo = newMemo
+                    lastStamp = stamp
+                    lastDefaults = (converter.defaults,converter.window)
+
+            stopEvent.wait(interval)
+    finally:
+        if executor != None:
+            executor.shutdown()
+
+def PrintNextFireTimes(inFile,count,start=None,outFile=None,tzBackend=None):
+    """ write every JOB_TZ entry of a crontab with its next count fire times,
+    utc and SERVER_TZ, as comments under it. tzBackend as of CronTzConverter"""
+    backend = GetTzBackend(tzBackend)
+    with open(inFile) as cronFileHandle, OutputWriter(outFile) as outWriter:
+        for (line,serverTz,jobTz,isEntry) in CronTzConverter().GetLineTasks(cronFileHandle):
+            if jobTz == None:
+                continue
+
+            outWriter.Write(line)
+            for (utcTs,serverTs) in GetNextFireTimes(GetLineAsRecord(line),jobTz,start,count,serverTz,backend):
+                serverText = " {0:%Y-%m-%d %H:%M %Z}".format(serverTs) if serverTs != None else ''
+                outWriter.Write("# {0:%Y-%m-%d %H:%M} UTC{1}\n".format(utcTs,serverText))
+
+def VerifyCrontab(inFile,convertedFile,now=None,reportFile=None,tzBackend=None):
+    """ check every JOB_TZ entry of a crontab fires at the same utc minutes
+    as the lines it was converted to in convertedFile, see VerifyEntry().
+    now is when it was converted, for default month and year. writes
+    entries with their missing and extra fires, returns entries that differ.
+    tzBackend as of CronTzConverter"""
+    defaults = GetDefaultValues(now)
+    backend = GetTzBackend(tzBackend)
+    (verified,differ) = (0,0)
+    with open(inFile) as inHandle, open(convertedFile) as outHandle, OutputWriter(reportFile) as outWriter:
+        for (line,record,serverTz,jobTz,periods) in GetVerifyGroups(inHandle,outHandle.readlines(),defaults):
+            (fires,missing,extra) = VerifyEntry(record,jobTz,serverTz,periods,defaults,backend)
+            start = GetUtcTs(periods[0][0],jobTz,backend)
+            verified += 1
+            outWriter.Write(line)
+            if not (1 in missing or 1 in extra):
+                outWriter.Write("# ok, {0} fires\n".format(fires))
+                continue
+
+            differ += 1
+            for (name,bits) in (('missing',missing),('extra',extra)):
+                if 1 in bits:
+                    shown = ', '.join("{0:%Y-%m-%d %H:%M}".format(ts) for ts in GetBitsTimes(bits,start,VERIFY_SHOW_FIRES))
+                    outWriter.Write("# {0} {1} of {2} fires, utc {3}\n".format(name,bits.count(1),fires,shown))
+
+    print("verified {0} entries, {1} differ".format(verified,differ),file=sys.stderr)
+    return differ
+
+def WriteStats(stats,statsFile,statsFormat='json'):
+    """ConversionStats to statsFile, json or prometheus text"""
+    with OutputWriter(statsFile,atomic=True) as statsWriter:
+        statsWriter.Write(stats.AsPrometheus() if statsFormat == 'prometheus' else stats.AsJson())
+
+def GetRunKey(crontab,windowMonths=None,now=None,dstPolicy=None,tzBackend=None):
+    """ what the output of crontab, a string, depends on: its content, the
+    month, the day with windowMonths, the tz backend, a name of TZ_BACKENDS,
+    and its data version, dstPolicy and ENTRY_CACHE_VERSION. the backend is
+    not built, see GetTzDataVersion(). crc32 as hashlib, imported by
+    GetContentHash() only, costs more to import than a run it lets skip"""
+    td = now if now != None else datetime.datetime.now()
+    period = td.strftime('%Y-%m-%d' if windowMonths != None else '%Y-%m')
+    content = crontab.encode()
+
+    dstPolicy = dstPolicy or DEFAULT_DST_POLICY
+    tzBackend = GetTzBackendName(tzBackend)
+    return "{0} {1:08x} {2} {3} {4} {5} {6} {7},{8}".format(ENTRY_CACHE_VERSION,zlib.crc32(content),len(content),period,windowMonths,
+            tzBackend,GetTzDataVersion(tzBackend),dstPolicy.gap,dstPolicy.overlap)
+
+def GetRunState(runKey,outFile):
+    return "{0} {1}".format(runKey,GetFileStamp(outFile))
+
+def IsOutputCurrent(stateFile,inFile,runKey,outFile):
+    """True if stateFile was saved for runKey of inFile and outFile wasn't touched since"""
+    return LoadBatchState(stateFile).get(os.path.abspath(inFile)) == GetRunState(runKey,outFile)
+
+def SaveRunState(stateFile,inFile,runKey,outFile):
+    """ record runKey of inFile in stateFile, same format as a --batch state.
+    other files recorded there are kept, so one stateFile does for many"""
+    state = LoadBatchState(stateFile)
+    state[os.path.abspath(inFile)] = GetRunState(runKey,outFile)
+    SaveBatchState(stateFile,state)
+
+def Main(inFile,outFile=None,atomic=False,jobs=1,cache=None,windowMonths=None,stats=None,stateFile=None,dstPolicy=None,noteFile=None,tzBackend=None,engine=None):
+    """ convert inFile to outFile. with stateFile, nothing is done when
+    inFile and the month are same as when stateFile was saved and outFile
+    is still as written then, see GetRunKey(). nothing but the file reads
+    and a look at the tz data version is done for that, no tz backend or
+    zone is loaded. returns False then, else True.
+    tzBackend and engine as of CronTzConverter"""
+    if stateFile != None:
+        with open(inFile) as cronFileHandle:
+            crontab = cronFileHandle.read()
+        runKey = GetRunKey(crontab,windowMonths,dstPolicy=dstPolicy,tzBackend=tzBackend)
+        if IsOutputCurrent(stateFile,inFile,runKey,outFile):
+            return False
+
+    converter = CronTzConverter(cache=cache,windowMonths=windowMonths,stats=stats,dstPolicy=dstPolicy,noteFile=noteFile,tzBackend=tzBackend,engine=engine)
+    executor = GetExecutor(jobs)
+    try:
+        with open(inFile) if stateFile == None else io.StringIO(crontab) as cronFileHandle, OutputWriter(outFile,atomic=atomic) as outWriter:
+            for block in converter.ConvertBlocks(cronFileHandle,executor=executor):
+                outWriter.Write(''.join(block))
+    finally:
+        if executor != None:
+            executor.shutdown()
+
+    if stateFile != None:
+        SaveRunState(stateFile,inFile,runKey,outFile)
+
+    return True
 
 
 if __name__ == '__main__':
     argParser = argparse.ArgumentParser()
-    argParser.add_argument('-i','--infile',type=str,required=True)
+    inputArgs = argParser.add_mutually_exclusive_group(required=True)
+    inputArgs.add_argument('-i','--infile',type=str)
+    inputArgs.add_argument('-b','--batch',type=str,nargs='+',metavar='PATH',help='crontab files or dirs to convert into --outdir')
     argParser.add_argument('-o','--outfile',type=str,required=False)
+    argParser.add_argument('--outdir',type=str,help='output dir of --batch')
+    argParser.add_argument('--state',type=str,help='json file with the last run of every input, default OUTDIR/'+BATCH_STATE_FILE+' for --batch. with --infile, skip the run if outfile is current')
+    argParser.add_argument('--atomic',action='store_true',help='write outfile to a temp file and rename it over outfile')
+    argParser.add_argument('-j','--jobs',type=int,default=1,help='convert entries on these many processes')
+    argParser.add_argument('--watch',action='store_true',help='keep running, convert infile to outfile again when it changes')
+    argParser.add_argument('--interval',type=float,default=WATCH_INTERVAL,help='secs between checks of --watch')
+    argParser.add_argument('--window-months',type=int,metavar='N',help='convert for N months from now, a block per period of same offset')
+    argParser.add_argument('--next',type=int,metavar='N',help='write next N fire times of JOB_TZ entries instead of converting')
+    argParser.add_argument('--from',type=datetime.datetime.fromisoformat,dest='from_ts',metavar='TS',help='--next from TS, iso format, utc if no offset, default now. for --verify, when it was converted')
+    argParser.add_argument('--verify',type=str,metavar='OUTFILE',help='check OUTFILE, converted from infile, fires at the same times')
+    argParser.add_argument('--stats',type=str,metavar='FILE',help='write wall time and entry counts of every conversion stage of every JOB_TZ entry to FILE')
+    argParser.add_argument('--stats-format',choices=['json','prometheus'],default='json',help='format of --stats')
+    argParser.add_argument('--dst-gap',choices=DST_GAP_POLICIES,default=DEFAULT_DST_POLICY.gap,help='job tz times a dst change skips: move them later by the length of the gap, or skip them')
+    argParser.add_argument('--dst-overlap',choices=DST_OVERLAP_POLICIES,default=DEFAULT_DST_POLICY.overlap,help='job tz times a dst change repeats: run once, in the second pass, or twice')
+    argParser.add_argument('--tz-backend',choices=sorted(TZ_BACKENDS),help='look zones up with pytz, the standard zoneinfo, or transition tables built from zoneinfo. default pytz, zoneinfo without pytz')
+    argParser.add_argument('--engine',choices=ADJUST_ENGINES,default=ADJUST_ENGINES[0],help='adjust entries for tz by shifting days as bits, or with numpy arrays of every fired minute, not for --window-months. same output')
+    argParser.add_argument('--cache',type=str,metavar='FILE',help='sqlite file caching converted entries across runs')
+    argParser.add_argument('--cache-size',type=int,default=ENTRY_CACHE_MAX_ENTRIES,help='entries kept in --cache')
 
     parsedArgs = vars(argParser.parse_args())
-    Main(parsedArgs['infile'],outFile=parsedArgs['outfile'])
+    if parsedArgs['jobs'] < 1:
+        argParser.error('--jobs should be 1 or more')
+    if parsedArgs['cache_size'] < 1:
+        argParser.error('--cache-size should be 1 or more')
+    if parsedArgs['window_months'] != None and parsedArgs['window_months'] < 1:
+        argParser.error('--window-months should be 1 or more')
+    if parsedArgs['next'] != None:
+        if parsedArgs['next'] < 1:
+            argParser.error('--next should be 1 or more')
+        if parsedArgs['batch'] != None or parsedArgs['watch'] or parsedArgs['window_months'] != None:
+            argParser.error('--next is for a single --infile')
+    if parsedArgs['verify'] != None:
+        if parsedArgs['batch'] != None or parsedArgs['watch'] or parsedArgs['next'] != None or parsedArgs['window_months'] != None:
+            argParser.error('--verify is for a single --infile')
+    elif parsedArgs['next'] == None and parsedArgs['from_ts'] != None:
+        argParser.error('--from needs --next or --verify')
+    if parsedArgs['stats'] != None and (parsedArgs['watch'] or parsedArgs['next'] != None or parsedArgs['verify'] != None):
+        argParser.error('--stats is for converting, not --watch, --next or --verify')
+    dstPolicy = DstPolicy(parsedArgs['dst_gap'],parsedArgs['dst_overlap'])
+    if dstPolicy != DEFAULT_DST_POLICY and (parsedArgs['next'] != None or parsedArgs['verify'] != None):
+        argParser.error('--dst-gap and --dst-overlap are for converting, not --next or --verify')
+
+    if parsedArgs['batch'] != None:
+        if parsedArgs['outdir'] == None:
+            argParser.error('--batch needs --outdir')
+        if parsedArgs['outfile'] != None:
+            argParser.error('--batch writes to --outdir, not --outfile')
+        if parsedArgs['watch']:
+            argParser.error('--watch is for a single --infile')
+    else:
+        if parsedArgs['atomic'] and parsedArgs['outfile'] == None:
+            argParser.error('--atomic needs --outfile')
+        if parsedArgs['outdir'] != None:
+            argParser.error('--outdir is for --batch')
+        if parsedArgs['state'] != None and (parsedArgs['outfile'] == None or parsedArgs['watch'] or parsedArgs['next'] != None or parsedArgs['verify'] != None):
+            argParser.error('--state with --infile needs --outfile, and is not for --watch, --next or --verify')
+        if parsedArgs['watch'] and parsedArgs['outfile'] == None:
+            argParser.error('--watch needs --outfile')
+
+    if parsedArgs['engine'] == 'numpy' and importlib.util.find_spec('numpy') == None:
+        argParser.error('--engine numpy needs numpy installed')
+    if parsedArgs['engine'] == 'numpy' and parsedArgs['window_months'] != None:
+        argParser.error('--engine numpy is not for --window-months')
+
+    cache = OpenEntryCache(parsedArgs['cache'],maxEntries=parsedArgs['cache_size'])
+    stats = ConversionStats() if parsedArgs['stats'] != None else None
+    try:
+        if parsedArgs['batch'] != None:
+            (converted,skipped) = ConvertFiles(parsedArgs['batch'],parsedArgs['outdir'],stateFile=parsedArgs['state'],
+                    atomic=parsedArgs['atomic'],jobs=parsedArgs['jobs'],cache=cache,windowMonths=parsedArgs['window_months'],stats=stats,
+                    dstPolicy=dstPolicy,noteFile=sys.stderr,tzBackend=parsedArgs['tz_backend'],engine=parsedArgs['engine'])
+            print("converted {0}, unchanged {1}".format(len(converted),len(skipped)),file=sys.stderr)
+        elif parsedArgs['verify'] != None:
+            if VerifyCrontab(parsedArgs['infile'],parsedArgs['verify'],now=parsedArgs['from_ts'],reportFile=parsedArgs['outfile'],tzBackend=parsedArgs['tz_backend']):
+                sys.exit(1)
+        elif parsedArgs['next'] != None:
+            PrintNextFireTimes(parsedArgs['infile'],parsedArgs['next'],start=parsedArgs['from_ts'],outFile=parsedArgs['outfile'],tzBackend=parsedArgs['tz_backend'])
+        elif parsedArgs['watch']:
+            WatchFile(parsedArgs['infile'],parsedArgs['outfile'],interval=parsedArgs['interval'],jobs=parsedArgs['jobs'],cache=cache,windowMonths=parsedArgs['window_months'],
+                    dstPolicy=dstPolicy,noteFile=sys.stderr,tzBackend=parsedArgs['tz_backend'],engine=parsedArgs['engine'])
+        else:
+            Main(parsedArgs['infile'],outFile=parsedArgs['outfile'],atomic=parsedArgs['atomic'],jobs=parsedArgs['jobs'],cache=cache,windowMonths=parsedArgs['window_months'],stats=stats,stateFile=parsedArgs['state'],
+                    dstPolicy=dstPolicy,noteFile=sys.stderr,tzBackend=parsedArgs['tz_backend'],engine=parsedArgs['engine'])
+
+        if stats != None:
+            WriteStats(stats,parsedArgs['stats'],parsedArgs['stats_format'])
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if cache != None:
+            cache.Close()
@@ -0,0 +1,296 @@
+#!/usr/bin/python3
+"""behaviour tests of cron_tz_conv.
+    python3 -m pytest -q test_cron_tz_conv.py, or python3 -m unittest test_cron_tz_conv
+optional packages, numpy and pytz, are skipped when not installed
+"""
+import collections
+import datetime
+import importlib.util
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+import cron_tz_conv
+
+HAS_NUMPY = importlib.util.find_spec('numpy') != None
+HAS_PYTZ = importlib.util.find_spec('pytz') != None
+
+""" (serverTz,jobTz) with dst on either side, negative and half hour dst,
+and a job tz without dst """
+DST_PAIRS = [
+    ('Asia/Calcutta','Europe/London'),
+    ('America/New_York','Europe/London'),
+    ('Australia/Lord_Howe','America/Santiago'),
+    ('UTC','America/New_York'),
+]
+""" months dst changes in, for the zones of DST_PAIRS """
+DST_MONTHS = [datetime.datetime(2026,month,1) for month in (3,4,10,11)]
+""" entries only of minute, hour and dom, dow merges may take in more days
+than fired, see MergeOnDomDow() """
+DST_ENTRIES = [
+    '*/20 0-3 * * * cmd',
+    '30 1 * * * cmd',
+    '0 2 8-14 * * cmd',
+    '15 23 31 * * cmd',
+]
+
+def GetTimes(line,serverTz,jobTz,now,**kwargs):
+    return cron_tz_conv.GetEntryTimes(cron_tz_conv.GetLineAsRecord(line),serverTz,jobTz,cron_tz_conv.GetDefaultValues(now),**kwargs)
+
+def GetLinesFireBits(lines,serverTz,now):
+    """ fires of converted lines in serverTz, or of all of them, over the
+    month of now and a few days around it"""
+    defaults = cron_tz_conv.GetDefaultValues(now)
+    start = now - datetime.timedelta(days=3)
+    end = (now + datetime.timedelta(days=34)).replace(day=1) + datetime.timedelta(days=3)
+    bits = bytearray(cron_tz_conv.GetMinutes(end - start))
+    for line in lines:
+        masks = cron_tz_conv.EntryMasks(cron_tz_conv.GetLineAsRecord(line),defaults)
+        lineBits = cron_tz_conv.GetFireBits(masks,serverTz,start,end)
+        bits = bytearray(x | y for (x,y) in zip(bits,lineBits))
+
+    return bits
+
+class AdjustTest(unittest.TestCase):
+    def testBlocksSameAsPerMinute(self):
+        for (serverTz,jobTz) in DST_PAIRS:
+            for now in DST_MONTHS:
+                defaults = cron_tz_conv.GetDefaultValues(now)
+                for line in DST_ENTRIES:
+                    record = cron_tz_conv.GetLineAsRecord(line)
+                    with self.subTest(serverTz=serverTz,jobTz=jobTz,now=now,line=line):
+                        self.assertEqual(
+                            collections.Counter(e[:6] for e in cron_tz_conv.AdjustForTz(record,serverTz,jobTz,defaults)),
+                            collections.Counter(e[:6] for e in cron_tz_conv.AdjustForTzPerMinute(record,serverTz,jobTz,defaults)))
+
+class CompactTest(unittest.TestCase):
+    def testFireSetKept(self):
+        for (serverTz,jobTz) in DST_PAIRS:
+            for now in DST_MONTHS:
+                defaults = cron_tz_conv.GetDefaultValues(now)
+                for line in DST_ENTRIES:
+                    record = cron_tz_conv.GetLineAsRecord(line)
+                    perMinute = list(cron_tz_conv.AdjustForTzPerMinute(record,serverTz,jobTz,defaults))
+                    compacted = cron_tz_conv.CompactEntries(list(perMinute))
+                    with self.subTest(serverTz=serverTz,jobTz=jobTz,now=now,line=line):
+                        fires = GetLinesFireBits([cron_tz_conv.FormatEntry(e) for e in perMinute],serverTz,now)
+                        self.assertEqual(GetLinesFireBits([cron_tz_conv.FormatEntry(e) for e in compacted],serverTz,now),fires)
+                        converted = GetTimes(line,serverTz,jobTz,now)
+                        self.assertEqual(GetLinesFireBits([t + ' cmd' for t in converted],serverTz,now),fires)
+
+    def testFixedPoint(self):
+        for (serverTz,jobTz) in DST_PAIRS:
+            for now in DST_MONTHS:
+                defaults = cron_tz_conv.GetDefaultValues(now)
+                for line in DST_ENTRIES:
+                    record = cron_tz_conv.GetLineAsRecord(line)
+                    compacted = cron_tz_conv.CompactEntries(cron_tz_conv.AdjustForTzPerMinute(record,serverTz,jobTz,defaults))
+                    with self.subTest(serverTz=serverTz,jobTz=jobTz,now=now,line=line):
+                        self.assertEqual(cron_tz_conv.CompactEntries(list(compacted)),compacted)
+
+class EngineTest(unittest.TestCase):
+    @unittest.skipUnless(HAS_NUMPY,'numpy not installed')
+    def testNumpySameAsPython(self):
+        policies = [None,cron_tz_conv.DstPolicy('skip','twice')]
+        for (serverTz,jobTz) in DST_PAIRS:
+            for now in DST_MONTHS:
+                for line in DST_ENTRIES + ['* 20 * * 1 cmd']:
+                    for dstPolicy in policies:
+                        with self.subTest(serverTz=serverTz,jobTz=jobTz,now=now,line=line,dstPolicy=dstPolicy):
+                            self.assertEqual(GetTimes(line,serverTz,jobTz,now,dstPolicy=dstPolicy,engine='numpy'),
+                                    GetTimes(line,serverTz,jobTz,now,dstPolicy=dstPolicy,engine='python'))
+
+class TzBackendTest(unittest.TestCase):
+    def GetBackendNames(self):
+        return ['pytz','zoneinfo','table'] if HAS_PYTZ else ['zoneinfo','table']
+
+    def testBackendsAgree(self):
+        (first,*others) = [cron_tz_conv.GetTzBackend(name) for name in self.GetBackendNames()]
+        for (serverTz,jobTz) in DST_PAIRS:
+            for now in DST_MONTHS:
+                for backend in others:
+                    with self.subTest(serverTz=serverTz,jobTz=jobTz,now=now,backend=backend.name):
+                        self.assertEqual(cron_tz_conv.GetOffsetTable(serverTz,jobTz,now.year,backend).segments,
+                                cron_tz_conv.GetOffsetTable(serverTz,jobTz,now.year,first).segments)
+                        for line in DST_ENTRIES:
+                            self.assertEqual(GetTimes(line,serverTz,jobTz,now,backend=backend),GetTimes(line,serverTz,jobTz,now,backend=first))
+
+class DstPolicyTest(unittest.TestCase):
+    """ Europe/London skips 01:00-02:00 on 2026-03-29 and repeats 01:00-02:00
+    on 2026-10-25, server in UTC"""
+    def GetLondonTimes(self,line,now,dstPolicy):
+        return GetTimes(line,'UTC','Europe/London',now,dstPolicy=dstPolicy)
+
+    def testGap(self):
+        now = datetime.datetime(2026,3,1)
+        self.assertEqual(self.GetLondonTimes('30 1 29 3 * cmd',now,None),['30 1 29 3 *'])
+        self.assertEqual(self.GetLondonTimes('30 1 29 3 * cmd',now,cron_tz_conv.DstPolicy('shift','once')),['30 1 29 3 *'])
+        self.assertEqual(self.GetLondonTimes('30 1 29 3 * cmd',now,cron_tz_conv.DstPolicy('skip','once')),[])
+
+    def testOverlap(self):
+        now = datetime.datetime(2026,10,1)
+        self.assertEqual(self.GetLondonTimes('30 1 25 10 * cmd',now,cron_tz_conv.DstPolicy('shift','once')),['30 1 25 10 *'])
+        self.assertEqual(self.GetLondonTimes('30 1 25 10 * cmd',now,cron_tz_conv.DstPolicy('shift','twice')),['30 0-1 25 10 *'])
+
+class WindowTest(unittest.TestCase):
+    CRONTAB = ['# SERVER_TZ=Asia/Calcutta\n','# JOB_TZ=Europe/London\n','* 20 * * 1 cmd\n']
+
+    def testPeriods(self):
+        output = cron_tz_conv.ConvertCrontab(self.CRONTAB,now=datetime.datetime(2026,10,16),windowMonths=6)
+        periods = [line.split(' JOB_TZ=')[0] for line in output if line.startswith('# VALID_FROM=')]
+        self.assertEqual(periods,[
+            '# VALID_FROM=2026-10-16 00:00 VALID_TO=2026-10-25 01:00',
+            '# VALID_FROM=2026-10-25 01:00 VALID_TO=2027-03-28 02:00',
+            '# VALID_FROM=2027-03-28 02:00 VALID_TO=2027-04-16 00:00',
+        ])
+        self.assertIn('30-59 0 * * 2 cmd \n',output)
+        self.assertIn('0-29 1 * * 2 cmd \n',output)
+        self.assertIn('#30-59 1 * * 2 cmd \n',output)
+        self.assertIn('#0-29 2 * * 2 cmd \n',output)
+
+    @unittest.skipUnless(HAS_NUMPY,'numpy not installed')
+    def testNumpyRejected(self):
+        with self.assertRaises(ValueError):
+            cron_tz_conv.CronTzConverter(windowMonths=6,engine='numpy')
+
+class NextFireTimesTest(unittest.TestCase):
+    def testAcrossGap(self):
+        record = cron_tz_conv.GetLineAsRecord('30 1 * * * cmd')
+        start = datetime.datetime(2026,3,28,12,tzinfo=datetime.timezone.utc)
+        times = cron_tz_conv.GetNextFireTimes(record,'Europe/London',start,3,'Asia/Calcutta')
+        self.assertEqual([utcTs.replace(tzinfo=None) for (utcTs,serverTs) in times],[
+            datetime.datetime(2026,3,29,1,30),
+            datetime.datetime(2026,3,30,0,30),
+            datetime.datetime(2026,3,31,0,30),
+        ])
+        self.assertEqual(times[0][1].replace(tzinfo=None),datetime.datetime(2026,3,29,7))
+
+    def testAcrossOverlap(self):
+        record = cron_tz_conv.GetLineAsRecord('30 1 * * * cmd')
+        times = cron_tz_conv.GetNextFireTimes(record,'Europe/London',datetime.datetime(2026,10,24,12),2)
+        self.assertEqual([(utcTs.replace(tzinfo=None),serverTs) for (utcTs,serverTs) in times],[
+            (datetime.datetime(2026,10,25,1,30),None),
+            (datetime.datetime(2026,10,26,1,30),None),
+        ])
+
+    def testDowZeroIsSunday(self):
+        record = cron_tz_conv.GetLineAsRecord('0 9 * * 0 cmd')
+        times = cron_tz_conv.GetNextFireTimes(record,'UTC',datetime.datetime(2026,10,17),2)
+        self.assertEqual([utcTs.replace(tzinfo=None) for (utcTs,serverTs) in times],[
+            datetime.datetime(2026,10,18,9),
+            datetime.datetime(2026,10,25,9),
+        ])
+
+class FileTest(unittest.TestCase):
+    CRONTAB = '# SERVER_TZ=Asia/Calcutta\n# JOB_TZ=Europe/London\n30 1 * * * cmd\n# JOB_TZ=Europe/London\n* 20 * * * cmd\n'
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempDir.cleanup)
+
+    def GetPath(self,name):
+        return os.path.join(self.tempDir.name,name)
+
+    def WriteFile(self,name,text):
+        with open(self.GetPath(name),'w') as fileHandle:
+            fileHandle.write(text)
+        return self.GetPath(name)
+
+    def SetVersion(self,version):
+        patcher = unittest.mock.patch.object(cron_tz_conv,'GetTzDataVersion',lambda name=None: version)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+class VerifyTest(FileTest):
+    """ a month without dst change, '*' dom is copied as written, so a
+    converted line fires on every day of a month offsets change in"""
+    def testVerify(self):
+        now = datetime.datetime(2026,7,1)
+        inFile = self.WriteFile('in',self.CRONTAB)
+        outFile = self.WriteFile('out',''.join(cron_tz_conv.ConvertCrontab(self.CRONTAB,now=now)))
+        self.assertEqual(cron_tz_conv.VerifyCrontab(inFile,outFile,now=now,reportFile=self.GetPath('report')),0)
+
+        with open(outFile) as outHandle:
+            tampered = outHandle.read().replace('0 6 ','5 6 ',1)
+        self.WriteFile('out',tampered)
+        self.assertEqual(cron_tz_conv.VerifyCrontab(inFile,outFile,now=now,reportFile=self.GetPath('report')),1)
+        with open(self.GetPath('report')) as reportHandle:
+            self.assertIn('# missing ',reportHandle.read())
+
+class EntryCacheTest(FileTest):
+    def testCachedRun(self):
+        now = datetime.datetime(2026,3,1)
+        with cron_tz_conv.EntryCache(self.GetPath('cache')) as cache:
+            first = cron_tz_conv.ConvertCrontab(self.CRONTAB,now=now,cache=cache)
+            stats = cron_tz_conv.ConversionStats()
+            self.assertEqual(cron_tz_conv.ConvertCrontab(self.CRONTAB,now=now,cache=cache,stats=stats),first)
+            self.assertTrue(all(entryStats.cached for entryStats in stats.entries))
+
+            self.SetVersion('newer')
+            stats = cron_tz_conv.ConversionStats()
+            cron_tz_conv.ConvertCrontab(self.CRONTAB,now=now,cache=cache,stats=stats)
+            self.assertFalse(any(entryStats.cached for entryStats in stats.entries))
+
+    def testKey(self):
+        masks = cron_tz_conv.EntryMasks(cron_tz_conv.GetLineAsRecord('30 1 * * * cmd'),cron_tz_conv.GetDefaultValues(datetime.datetime(2026,3,1)))
+        key = cron_tz_conv.GetEntryCacheKey(masks,'UTC','Europe/London',backend=cron_tz_conv.GetTzBackend('zoneinfo'))
+        self.assertNotEqual(cron_tz_conv.GetEntryCacheKey(masks,'UTC','Europe/London',backend=cron_tz_conv.GetTzBackend('table')),key)
+        self.assertNotEqual(cron_tz_conv.GetEntryCacheKey(masks,'UTC','Europe/London',cron_tz_conv.DstPolicy('skip','once'),cron_tz_conv.GetTzBackend('zoneinfo')),key)
+        self.SetVersion('newer')
+        self.assertNotEqual(cron_tz_conv.GetEntryCacheKey(masks,'UTC','Europe/London',backend=cron_tz_conv.GetTzBackend('zoneinfo')),key)
+
+class BatchTest(FileTest):
+    def testSkip(self):
+        inFile = self.WriteFile('crontab',self.CRONTAB)
+        outDir = self.GetPath('out')
+        self.assertEqual(cron_tz_conv.ConvertFiles([inFile],outDir),([inFile],[]))
+        self.assertEqual(cron_tz_conv.ConvertFiles([inFile],outDir),([],[inFile]))
+
+        self.WriteFile('crontab',self.CRONTAB + '0 5 * * * other\n')
+        self.assertEqual(cron_tz_conv.ConvertFiles([inFile],outDir),([inFile],[]))
+
+        self.SetVersion('newer')
+        self.assertEqual(cron_tz_conv.ConvertFiles([inFile],outDir),([inFile],[]))
+        self.assertEqual(cron_tz_conv.ConvertFiles([inFile],outDir),([],[inFile]))
+
+    def testContentHash(self):
+        defaults = cron_tz_conv.GetDefaultValues(datetime.datetime(2026,3,1))
+        digest = cron_tz_conv.GetContentHash(self.CRONTAB,defaults)
+        self.assertEqual(cron_tz_conv.GetContentHash(self.CRONTAB,defaults),digest)
+        self.assertNotEqual(cron_tz_conv.GetContentHash(self.CRONTAB,cron_tz_conv.GetDefaultValues(datetime.datetime(2026,4,1))),digest)
+        self.assertNotEqual(cron_tz_conv.GetContentHash(self.CRONTAB,defaults,dstPolicy=cron_tz_conv.DstPolicy('skip','once')),digest)
+        self.SetVersion('newer')
+        self.assertNotEqual(cron_tz_conv.GetContentHash(self.CRONTAB,defaults),digest)
+
+class RunStateTest(FileTest):
+    def testSkip(self):
+        inFile = self.WriteFile('crontab',self.CRONTAB)
+        (outFile,stateFile) = (self.GetPath('out'),self.GetPath('state'))
+        self.assertTrue(cron_tz_conv.Main(inFile,outFile,stateFile=stateFile))
+        self.assertFalse(cron_tz_conv.Main(inFile,outFile,stateFile=stateFile))
+
+        self.WriteFile('out','edited\n')
+        os.utime(outFile,ns=(0,0))
+        self.assertTrue(cron_tz_conv.Main(inFile,outFile,stateFile=stateFile))
+        self.assertFalse(cron_tz_conv.Main(inFile,outFile,stateFile=stateFile))
+
+        self.SetVersion('newer')
+        self.assertTrue(cron_tz_conv.Main(inFile,outFile,stateFile=stateFile))
+        self.assertFalse(cron_tz_conv.Main(inFile,outFile,stateFile=stateFile))
+
+    def testRunKey(self):
+        now = datetime.datetime(2026,3,1)
+        key = cron_tz_conv.GetRunKey(self.CRONTAB,now=now,tzBackend='zoneinfo')
+        self.assertEqual(cron_tz_conv.GetRunKey(self.CRONTAB,now=now.replace(day=20),tzBackend='zoneinfo'),key)
+        self.assertNotEqual(cron_tz_conv.GetRunKey(self.CRONTAB,windowMonths=6,now=now.replace(day=20),tzBackend='zoneinfo'),
+                cron_tz_conv.GetRunKey(self.CRONTAB,windowMonths=6,now=now,tzBackend='zoneinfo'))
+        self.assertNotEqual(cron_tz_conv.GetRunKey(self.CRONTAB,now=now.replace(month=4),tzBackend='zoneinfo'),key)
+        self.assertNotEqual(cron_tz_conv.GetRunKey(self.CRONTAB + '\n',now=now,tzBackend='zoneinfo'),key)
+        self.assertNotEqual(cron_tz_conv.GetRunKey(self.CRONTAB,now=now,tzBackend='table'),key)
+        self.SetVersion('newer')
+        self.assertNotEqual(cron_tz_conv.GetRunKey(self.CRONTAB,now=now,tzBackend='zoneinfo'),key)
+
+
+if __name__ == '__main__':
+    unittest.main()